@@ -0,0 +1,381 @@
+"""Benchmark the converters on the test data and synthetic (scaled-up) files.
+
+Every case runs in its own process: the upload is gzipped and then spooled (decompressed
+into a file), converted, downsampled (pyramid), compacted and encoded as JSON. For each
+stage the wall time, the peak RSS and the rows per second are reported.
+
+    python dev/benchmark.py
+    python dev/benchmark.py --threshold 0.5 --baseline dev/benchmark_baseline.json
+    python dev/benchmark.py --save-baseline dev/benchmark_baseline.json
+
+The results are compared with the committed baseline (dev/benchmark_baseline.json,
+use --baseline "" to skip it): the script exits with status 1 if a stage got slower
+(or needs more memory) than the baseline by more than the threshold (a fraction).
+The baseline depends on the machine, save a new one (on the old commit) before
+comparing on another machine.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+BASELINE = Path(__file__).parent.resolve() / "benchmark_baseline.json"
+CHARGE_DISCHARGE = "CHARGE-DISCHARGE-GALVANOSTATIC CYCLING"
+
+# name -> (file, converter, conversion arguments, spool encoding)
+CASES = {
+    "arbin-res": (
+        "post-arbin-cellpy.res",
+        "cellpy",
+        {
+            "instrument": "ARBIN-BT-2000",
+            "test_type": CHARGE_DISCHARGE,
+            "extension": "RES",
+        },
+        None,
+    ),
+    "maccor-ubham": (
+        "post-maccor-01.txt",
+        "cellpy",
+        {
+            "instrument": "MACCOR-S4000-UBHAM",
+            "test_type": CHARGE_DISCHARGE,
+            "extension": "TXT",
+        },
+        None,
+    ),
+    "maccor-kit": (
+        "post-maccor-03.txt",
+        "cellpy",
+        {
+            "instrument": "MACCOR-S4000-KIT",
+            "test_type": CHARGE_DISCHARGE,
+            "extension": "TXT",
+        },
+        None,
+    ),
+    "xrd-synthetic": ("synthetic.xrd.txt", "xrd_custom", {}, None),
+    "mpr-synthetic": ("synthetic.mpr", "galvani", {}, None),
+}
+STAGES = ["spool", "convert", "pyramid", "compact", "json"]
+# rows of the synthetic files (multiplied by --scale)
+XRD_ROWS = 500_000
+XRD_SCANS = 5
+MPR_ROWS = 1_000_000
+# differences below these are noise, not regressions
+MIN_SECONDS = 0.05
+MIN_RSS_BYTES = 16 * 1024**2
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS of the process (Linux only), returns False if not possible."""
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    """The peak RSS of the process in bytes (since the last reset on Linux)."""
+
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def write_xrd(path, rows, scans=XRD_SCANS):
+    """Write a two-column XRD file with several scans."""
+
+    rng = np.random.default_rng(0)
+    per_scan = rows // scans
+    with open(path, "w") as f:
+        for scan in range(scans):
+            f.write(f"Scan {scan + 1}\n2Theta  Intensity\n")
+            two_theta = 10 + np.arange(per_scan) * 0.001
+            intensity = rng.integers(0, 10_000, per_scan)
+            np.savetxt(f, np.column_stack([two_theta, intensity]), fmt="%.4f %d")
+    return path
+
+
+def write_mpr(path, rows):
+    """Write a BioLogic .mpr file (settings, data and log module)."""
+
+    from galvani import BioLogic
+
+    column_ids = [1, 2, 4, 6, 11, 24]  # mode, ox/red, time, Ewe, <I>, cycle number
+    rng = np.random.default_rng(0)
+    dtype, _ = BioLogic.VMPdata_dtype_from_colIDs(column_ids)
+    records = np.zeros(rows, dtype=dtype)
+    records["flags"] = rng.integers(1, 3, rows) | (rng.integers(0, 2, rows) << 2)
+    records["time/s"] = np.arange(rows) * 0.5
+    records["Ewe/V"] = rng.uniform(2.5, 4.2, rows)
+    records["<I>/mA"] = rng.uniform(-1, 1, rows)
+    records["cycle number"] = np.arange(rows) // 1000
+    data = (
+        np.array([rows], dtype="<u4").tobytes()
+        + bytes([len(column_ids)])
+        + np.array(column_ids, dtype="<u2").tobytes()
+    ).ljust(405, b"\x00") + records.tobytes()
+
+    def module(shortname, longname, content, version=0):
+        header = np.zeros(
+            1,
+            dtype=[
+                ("shortname", "S10"),
+                ("longname", "S25"),
+                ("length", "<u4"),
+                ("version", "<u4"),
+                ("date", "S8"),
+            ],
+        )
+        header[0] = (
+            shortname.ljust(10),
+            longname.ljust(25),
+            len(content),
+            version,
+            b"01/01/24",
+        )
+        return b"MODULE" + header.tobytes() + content
+
+    with open(path, "wb") as f:
+        f.write(BioLogic.MPR_MAGIC)
+        f.write(module(b"VMP Set", b"VMP settings", bytes(100)))
+        f.write(module(b"VMP data", b"VMP data", data, version=2))
+        f.write(module(b"VMP LOG", b"VMP LOG", bytes(600)))
+    return path
+
+
+def _source(name, folder, scale):
+    file_name = CASES[name][0]
+    if name == "xrd-synthetic":
+        return write_xrd(Path(folder) / file_name, int(XRD_ROWS * scale))
+    if name == "mpr-synthetic":
+        return write_mpr(Path(folder) / file_name, int(MPR_ROWS * scale))
+    return FIXTURE_DIR / file_name
+
+
+def _measure(stages, stage, function, *args, **kwargs):
+    _reset_peak_rss()
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    stages[stage] = {
+        "seconds": time.perf_counter() - started,
+        "peak_rss": _peak_rss(),
+    }
+    return result
+
+
+def _json_size(data):
+    from leafspy.responses import iter_json
+
+    return sum(len(chunk) for chunk in iter_json(data))
+
+
+def run_once(name, source, folder):
+    """Run all stages of a case once, returns the rows and the stages."""
+
+    from leafspy.compact import compact_frame
+    from leafspy.data_handler import convert_file
+    from leafspy.downsampling import build_pyramid
+    from leafspy.ingest import spool_compressed
+
+    _, data_converter, arguments, encoding = CASES[name]
+    compressed = gzip.compress(Path(source).read_bytes(), compresslevel=6)
+    location = Path(folder) / f"upload{Path(source).suffix}"
+    stages = {}
+    _measure(
+        stages,
+        "spool",
+        spool_compressed,
+        io.BytesIO(compressed),
+        location,
+        encoding=encoding,
+    )
+    success, data = _measure(
+        stages,
+        "convert",
+        convert_file,
+        data_converter,
+        str(location),
+        pyramid=False,
+        **arguments,
+    )
+    if not success:
+        raise RuntimeError(f"conversion failed: {data!r}")
+    df = data["experiment_data"]
+    _measure(stages, "pyramid", build_pyramid, df)
+    _measure(stages, "compact", compact_frame, df)
+    _measure(stages, "json", _json_size, data)
+    rows = len(df)
+    for stage in stages.values():
+        stage["rows_per_second"] = rows / stage["seconds"] if stage["seconds"] else None
+    return rows, stages
+
+
+def run_case(name, scale=1.0, repeat=1):
+    """Run a case repeat times, returns the best (lowest) time and RSS of each stage."""
+
+    from leafspy.data_handler import prewarm
+
+    # the converter backends are imported before anything is measured
+    prewarm()
+    with tempfile.TemporaryDirectory() as folder:
+        source = _source(name, folder, scale)
+        size = os.path.getsize(source)
+        runs = [run_once(name, source, folder) for _ in range(repeat)]
+    rows = runs[0][0]
+    stages = {}
+    for stage in STAGES:
+        measured = [run_stages[stage] for _, run_stages in runs]
+        best = min(measured, key=lambda m: m["seconds"])
+        stages[stage] = {
+            "seconds": best["seconds"],
+            "peak_rss": min(m["peak_rss"] for m in measured),
+            "rows_per_second": best["rows_per_second"],
+        }
+    return {"rows": rows, "size": size, "stages": stages}
+
+
+def _run_case_safely(name, scale, repeat):
+    try:
+        return run_case(name, scale, repeat)
+    except Exception as err:
+        return {"error": f"{type(err).__name__}: {err}"}
+
+
+def run(cases, scale=1.0, repeat=1):
+    """Run the cases, each in a new process."""
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in cases:
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(_run_case_safely, (name, scale, repeat))
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processors": os.cpu_count(),
+        "scale": scale,
+        "repeat": repeat,
+        "cases": results,
+    }
+
+
+def compare(results, baseline, threshold=0.25):
+    """The stages that regressed against the baseline (as messages)."""
+
+    regressions = []
+    for name, case in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None or "stages" not in base:
+            continue
+        if "stages" not in case:
+            regressions.append(f"{name}: {case.get('error', 'failed')}")
+            continue
+        for stage, measured in case["stages"].items():
+            if stage not in base["stages"]:
+                continue
+            before = base["stages"][stage]
+            for key, noise, unit in [
+                ("seconds", MIN_SECONDS, "s"),
+                ("peak_rss", MIN_RSS_BYTES, " bytes"),
+            ]:
+                limit = before[key] * (1 + threshold)
+                if measured[key] > limit and measured[key] - before[key] > noise:
+                    regressions.append(
+                        f"{name}/{stage}: {key} {measured[key]:.3f}{unit} "
+                        f"(baseline {before[key]:.3f}{unit}, limit {limit:.3f}{unit})"
+                    )
+    return regressions
+
+
+def report(results):
+    """The results as a table."""
+
+    lines = [
+        f"{'case':<15} {'stage':<8} {'rows':>9} {'seconds':>9} {'peak MB':>9} "
+        f"{'rows/s':>12}"
+    ]
+    for name, case in results["cases"].items():
+        if "error" in case:
+            lines.append(f"{name:<15} failed: {case['error']}")
+            continue
+        for stage, measured in case["stages"].items():
+            lines.append(
+                f"{name:<15} {stage:<8} {case['rows']:>9} {measured['seconds']:>9.3f} "
+                f"{measured['peak_rss'] / 1024**2:>9.1f} "
+                f"{measured['rows_per_second'] or 0:>12.0f}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="size factor of the synthetic files"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="write the results as baseline")
+    parser.add_argument(
+        "--baseline",
+        default=str(BASELINE),
+        help="compare the results with this baseline (empty to skip)",
+    )
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases {sorted(unknown)}, choose from {list(CASES)}")
+
+    # read before --save-baseline may overwrite it
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    results = run(cases, args.scale, args.repeat)
+    print(report(results))
+    for path in filter(None, [args.output, args.save_baseline]):
+        Path(path).write_text(json.dumps(results, indent=2))
+        print(f"results written to {path}")
+
+    if baseline is not None:
+        if baseline.get("scale") != args.scale:
+            print(f"baseline {args.baseline} has scale {baseline.get('scale')}, skipped")
+            return 0
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regressions (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
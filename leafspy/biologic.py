@@ -0,0 +1,138 @@
+"""Memory-mapped reader for BioLogic .mpr files."""
+
+import contextlib
+import io
+import logging
+import mmap
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from galvani.BioLogic import (
+    MPR_MAGIC,
+    VMPdata_dtype_from_colIDs,
+    parse_BioLogic_date,
+    read_VMP_modules,
+)
+
+from .staging import is_buffer
+
+# the LOG module has the (OLE) start timestamp at one of these offsets
+OLE_TIMESTAMP_OFFSETS = [465, 469, 473, 585]
+OLE_BASE = datetime(1899, 12, 30)
+
+
+def _modules(f):
+    """The module headers of the file (the module data is not read)."""
+
+    magic = f.read(len(MPR_MAGIC))
+    if magic != MPR_MAGIC:
+        raise ValueError(f"Invalid magic for .mpr file: {magic!r}")
+    modules = {}
+    for module in read_VMP_modules(f, read_module_data=False):
+        modules[module["shortname"].decode("ascii").strip()] = module
+    return modules
+
+
+def _data_layout(mm, module):
+    """The column ids, number of rows and offset of the records of the data module."""
+
+    offset = module["offset"]
+    rows = int(np.frombuffer(mm, dtype="<u4", count=1, offset=offset)[0])
+    n_columns = mm[offset + 4]
+    version = module["version"]
+    if version == 0:
+        # EC-Lab >= 11.50 writes the column ids as u2 (one zero byte each)
+        if mm[offset + 5]:
+            column_ids = np.frombuffer(mm, dtype="u1", count=n_columns, offset=offset + 5)
+            data_start = 100
+        else:
+            column_ids = np.frombuffer(
+                mm, dtype="u1", count=n_columns * 2, offset=offset + 5
+            )[1::2]
+            data_start = 1007
+    elif version in [2, 3]:
+        column_ids = np.frombuffer(mm, dtype="<u2", count=n_columns, offset=offset + 5)
+        data_start = 406 if version == 3 else 405
+    else:
+        raise ValueError(f"Unrecognised version for data module: {version}")
+    return column_ids.tolist(), rows, offset + data_start
+
+
+def _timestamp(mm, module):
+    """The start of the acquisition (from the LOG module)."""
+
+    for offset in OLE_TIMESTAMP_OFFSETS:
+        if offset + 8 > module["length"]:
+            continue
+        days = np.frombuffer(mm, dtype="<f8", count=1, offset=module["offset"] + offset)
+        if 40000 < days[0] < 50000:
+            return OLE_BASE + timedelta(days=float(days[0]))
+    return None
+
+
+def _module_info(module):
+    return {
+        "name": module["longname"].decode("ascii", errors="replace").strip(),
+        "version": int(module["version"]),
+        "date": module["date"].decode("ascii", errors="replace"),
+        "length": int(module["length"]),
+    }
+
+
+@contextlib.contextmanager
+def _mapped(file_name):
+    """The module headers and the data of the file (memory-mapped, unless it is bytes)."""
+
+    if is_buffer(file_name):
+        yield _modules(io.BytesIO(file_name)), file_name
+        return
+    with open(file_name, "rb") as f:
+        modules = _modules(f)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield modules, mm
+
+
+def read_mpr(file_name):
+    """Read a BioLogic .mpr file into a frame with all rows, and the file metadata.
+
+    The records of the data module are read as a NumPy structured array over a
+    memory map of the file and copied column by column into the frame. The packed
+    flags are kept (as galvani does) and also split into their own columns.
+    file_name can also be the content of the file (bytes).
+    """
+
+    with _mapped(file_name) as (modules, mm):
+        if "VMP data" not in modules:
+            raise ValueError("No data module in .mpr file")
+        column_ids, rows, offset = _data_layout(mm, modules["VMP data"])
+        dtype, flags = VMPdata_dtype_from_colIDs(column_ids)
+        end = modules["VMP data"]["offset"] + modules["VMP data"]["length"]
+        if offset + rows * dtype.itemsize > end:
+            raise ValueError(
+                f"Expected {rows} rows in the data module, found "
+                f"{(end - offset) // dtype.itemsize}"
+            )
+        records = np.frombuffer(mm, dtype=dtype, count=rows, offset=offset)
+        df = pd.DataFrame({name: np.array(records[name]) for name in dtype.names})
+        timestamp = _timestamp(mm, modules["VMP LOG"]) if "VMP LOG" in modules else None
+        del records  # the memory map can only be closed without exported buffers
+
+    for name, (mask, flag_type) in flags.items():
+        df[name] = (df["flags"] & mask).astype(flag_type)
+
+    info = {
+        "data points": rows,
+        "columns": list(df.columns),
+        "data module version": int(modules["VMP data"]["version"]),
+        "modules": [_module_info(module) for module in modules.values()],
+    }
+    if "VMP Set" in modules:
+        info["start date"] = str(parse_BioLogic_date(modules["VMP Set"]["date"]))
+    if "VMP LOG" in modules:
+        info["end date"] = str(parse_BioLogic_date(modules["VMP LOG"]["date"]))
+    if timestamp is not None:
+        info["acquisition started on"] = timestamp.isoformat(sep=" ")
+    source = "memory" if is_buffer(file_name) else file_name
+    logging.debug(f"read {rows} rows ({len(column_ids)} columns) from {source}")
+    return df, info
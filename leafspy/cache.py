@@ -0,0 +1,158 @@
+"""On-disk cache for conversion results."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+
+CACHE_SUFFIX = ".pickle"
+
+
+class ConversionCache:
+    """Content addressed cache of conversion results with size based LRU eviction.
+
+    Entries are stored as ``<key>.pickle`` in ``directory``: the pickled versions of the
+    converter backends, followed by the pickled conversion result.
+    The modification time of an entry is updated on every hit, so evicting the
+    oldest entries first gives least-recently-used eviction (also across restarts).
+    """
+
+    def __init__(self, directory, max_size, versions=None):
+        self.directory = Path(directory).resolve()
+        self.max_size = max_size
+        self.versions = versions or {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_hash, **fingerprint):
+        """Cache key for a file (content hash) converted with the given fingerprint."""
+
+        fingerprint = json.dumps(fingerprint, sort_keys=True, default=str)
+        return hashlib.sha256(f"{file_hash}:{fingerprint}".encode()).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}{CACHE_SUFFIX}"
+
+    def _entries(self):
+        if not self.directory.is_dir():
+            return []
+        return [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(CACHE_SUFFIX)
+        ]
+
+    def _entry_stats(self):
+        """The entries with their stat results (skipping the ones removed meanwhile)."""
+
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry, entry.stat()))
+            except FileNotFoundError:
+                # e.g. evicted by another process
+                continue
+        return entries
+
+    def get(self, key):
+        """Return the cached conversion result, or None."""
+
+        path = self._path(key)
+        data = None
+        try:
+            with open(path, "rb") as f:
+                stale = pickle.load(f) != self.versions
+                if not stale:
+                    data = pickle.load(f)
+            if stale:
+                logging.debug(f"cache entry {key} was created with other versions")
+                self._remove(path)
+            else:
+                os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        logging.debug(f"cache {'miss' if data is None else 'hit'}: {key}")
+        return data
+
+    def put(self, key, data):
+        """Store a conversion result and evict old entries if the cache is too large."""
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.versions, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, self._path(key))
+        except (OSError, pickle.PicklingError) as err:
+            logging.debug(f"could not store cache entry {key}: {err}")
+            self._remove(tmp_name)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size."""
+
+        with self._lock:
+            entries = sorted(self._entry_stats(), key=lambda e: e[1].st_mtime)
+            total = sum(stat.st_size for _, stat in entries)
+            while entries and total > self.max_size:
+                entry, stat = entries.pop(0)
+                total -= stat.st_size
+                self._remove(entry.path)
+                self.evictions += 1
+
+    def purge_stale(self):
+        """Remove all entries that were created with other (e.g. older cellpy) versions."""
+
+        removed = 0
+        for entry in self._entries():
+            try:
+                with open(entry.path, "rb") as f:
+                    versions = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                versions = None
+            if versions != self.versions:
+                self._remove(entry.path)
+                removed += 1
+        logging.debug(f"removed {removed} stale cache entries")
+        return removed
+
+    def clear(self):
+        """Remove all entries."""
+
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def stats(self):
+        """Counters and size of the cache."""
+
+        entries = self._entry_stats()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(stat.st_size for _, stat in entries),
+            "max_size": self.max_size,
+        }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            logging.debug(f"could not remove cache file {path}")
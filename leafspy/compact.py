@@ -0,0 +1,115 @@
+"""Downcasting of converted frames to compact dtypes."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+# a float64 column is stored as float32 if the round-trip error is at most this
+# fraction of the resolution of the column (the median step between rows)
+FLOAT32_TOLERANCE = 0.1
+# counters that are stored as the smallest integer type, also when they are floats
+INTEGER_COUNTERS = ["data_point", "cycle_index", "step_index"]
+# text columns with at most this fraction of distinct values are stored as categories
+CATEGORY_MAX_FRACTION = 0.5
+# timestamps are stored as integers since the epoch in this unit
+EPOCH_UNIT = "ms"
+# float32 values are written with this many significant digits in text responses
+FLOAT32_DIGITS = 7
+
+
+def _float32_allowed(values):
+    """Check if the float64 values can be stored as float32 (see FLOAT32_TOLERANCE)."""
+
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return True
+    if np.abs(values).max() > np.finfo(np.float32).max:
+        return False
+    error = np.abs(values.astype(np.float32).astype(np.float64) - values).max()
+    if error == 0:
+        return True
+    steps = np.abs(np.diff(values))
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return False
+    return error <= FLOAT32_TOLERANCE * np.median(steps)
+
+
+def _is_timestamp(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return True
+    return values.dtype == object and pd.api.types.infer_dtype(
+        values, skipna=True
+    ) in ["datetime", "datetime64"]
+
+
+def compact_column(values, name=None):
+    """The values (a Series) with the most compact dtype that keeps them."""
+
+    if _is_timestamp(values):
+        timestamps = pd.to_datetime(values)
+        if timestamps.isna().any():
+            return values
+        if timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_convert("UTC").dt.tz_localize(None)
+        return timestamps.dt.as_unit(EPOCH_UNIT).astype(np.int64)
+    if values.dtype == object:
+        if (
+            pd.api.types.infer_dtype(values, skipna=True) == "string"
+            and values.nunique() <= CATEGORY_MAX_FRACTION * len(values)
+        ):
+            return values.astype("category")
+        return values
+    if pd.api.types.is_bool_dtype(values):
+        return values
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast="integer")
+    if values.dtype == np.float64:
+        array = values.to_numpy()
+        if (
+            name in INTEGER_COUNTERS
+            and np.isfinite(array).all()
+            and (array == np.round(array)).all()
+        ):
+            return pd.to_numeric(values.astype(np.int64), downcast="integer")
+        if _float32_allowed(array):
+            return values.astype(np.float32)
+    return values
+
+
+def compact_frame(df):
+    """Downcast the columns (and an integer index) of the frame.
+
+    Returns the compact frame and the number of bytes saved.
+    """
+
+    before = df.memory_usage(index=True, deep=True).sum()
+    df = pd.DataFrame(
+        {column: compact_column(df[column], column) for column in df.columns},
+        index=df.index,
+    )
+    if pd.api.types.is_integer_dtype(df.index) and not isinstance(
+        df.index, pd.RangeIndex
+    ):
+        df.index = pd.Index(
+            pd.to_numeric(df.index, downcast="integer"), name=df.index.name
+        )
+    saved = int(before - df.memory_usage(index=True, deep=True).sum())
+    logging.debug(f"compacted frame {df.shape}: {saved} bytes saved")
+    return df, saved
+
+
+def float32_as_decimal(values):
+    """float32 values as float64 rounded to FLOAT32_DIGITS significant digits.
+
+    Written as text, the values are then as short as the float32 precision allows
+    (instead of e.g. 0.1000000015).
+    """
+
+    values = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude = np.where(np.isfinite(magnitude), magnitude, 0)
+    scale = 10.0 ** (FLOAT32_DIGITS - 1 - magnitude)
+    return np.round(values * scale) / scale
@@ -0,0 +1,84 @@
+"""Compression of (streamed) responses, negotiated with Accept-Encoding."""
+
+import logging
+import zlib
+
+# content encodings in order of preference (zstd needs the zstandard package)
+ENCODINGS = ["zstd", "gzip"]
+DEFAULT_LEVELS = {"zstd": 3, "gzip": 6}
+
+
+def available_encodings():
+    """The content encodings this server can produce (in order of preference)."""
+
+    encodings = []
+    for encoding in ENCODINGS:
+        if encoding == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                continue
+        encodings.append(encoding)
+    return encodings
+
+
+def negotiate_encoding(accept_encodings, encodings=None):
+    """The best content encoding for the Accept-Encoding header (None for identity).
+
+    accept_encodings is the parsed header (request.accept_encodings), for equal quality
+    values the order of encodings decides.
+    """
+
+    return accept_encodings.best_match(
+        encodings if encodings is not None else available_encodings()
+    )
+
+
+def compressor(encoding, level=None):
+    """A compression object (with compress and flush) for the content encoding."""
+
+    level = level if level is not None else DEFAULT_LEVELS[encoding]
+    if encoding == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unknown content encoding {encoding}")
+
+
+def peek_chunks(chunks, size):
+    """Read chunks until they have at least size bytes.
+
+    Returns the chunks that were read, their total size and an iterator over the
+    remaining chunks.
+    """
+
+    iterator = iter(chunks)
+    head = []
+    read = 0
+    for chunk in iterator:
+        head.append(chunk)
+        read += len(chunk)
+        if read >= size:
+            break
+    return head, read, iterator
+
+
+def compress_chunks(head, rest, encoding, level=None):
+    """Compress the chunks of head and then rest (str chunks are UTF-8 encoded)."""
+
+    compress = compressor(encoding, level)
+    written = read = 0
+    for chunks in [head, rest]:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            read += len(chunk)
+            if data := compress.compress(chunk):
+                written += len(data)
+                yield data
+    data = compress.flush()
+    written += len(data)
+    yield data
+    logging.debug(f"compressed response with {encoding}: {read} -> {written} bytes")
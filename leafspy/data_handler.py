@@ -3,15 +3,104 @@
 # TODO: create a dataclass that contains the response instead of using a dictionary. This makes it possible to later on
 #  edit how we would like to make the response without manually updating each transform_ function.
 
-import json
+import contextlib
+import importlib
 import logging
 import os
+import tempfile
+import time
+from importlib import metadata
+
+from . import profiling
+from .staging import STAGED_PREFIX, is_buffer
+
+# The converter backends (cellpy, galvani, pandas, psycopg2 and the leafspy modules
+# using them) are imported on first use, see prewarm() for loading them eagerly.
+BACKEND_MODULES = [
+    "pandas",
+    "cellpy",
+    "galvani",
+    "psycopg2",
+    ".biologic",
+    ".compact",
+    ".downsampling",
+    ".maccor",
+    ".xrd",
+]
+
+# Increase when a change in leafspy changes the output of the converters
+# (this invalidates cached conversion results).
+CONVERTER_VERSION = 4
+# read the Maccor txt files with the native reader (maccor.py) instead of cellpy
+NATIVE_MACCOR_READER = True
+# keyword arguments of transform_data_cellpy that are not passed on to cellpy.get
+CELLPY_OPTIONS = {
+    "instrument",
+    "test_type",
+    "extension",
+    "data_format_model",
+    "projection",
+    "native_reader",
+    "compact",
+    "parse_workers",
+    "transcoded",
+    "append",
+    "resume",
+}
 
-import cellpy
-import psycopg2
-from psycopg2 import Error
-from galvani import BioLogic
-import pandas as pd
+# the summary columns returned (unless other columns are requested)
+SUMMARY_COLUMNS = [
+    "cycle_index",
+    "data_point",
+    "test_time",
+    "date_time",
+    "end_voltage_charge",
+    "end_voltage_discharge",
+    "charge_capacity",
+    "discharge_capacity",
+    "coulombic_efficiency",
+    "cumulated_coulombic_efficiency",
+    "cumulated_charge_capacity",
+    "cumulated_discharge_capacity",
+    "discharge_capacity_loss",
+    "charge_capacity_loss",
+    "coulombic_difference",
+    "cumulated_coulombic_difference",
+    "cumulated_discharge_capacity_loss",
+    "cumulated_charge_capacity_loss",
+    "shifted_charge_capacity",
+    "shifted_discharge_capacity",
+    "cumulated_ric",
+    "cumulated_ric_sei",
+    "cumulated_ric_disconnect",
+    "normalized_cycle_index",
+    "charge_c_rate",
+    "discharge_c_rate",
+    "discharge_capacity_gravimetric",
+    "charge_capacity_gravimetric",
+    "cumulated_charge_capacity_gravimetric",
+    "cumulated_discharge_capacity_gravimetric",
+    "coulombic_difference_gravimetric",
+    "cumulated_coulombic_difference_gravimetric",
+    "discharge_capacity_loss_gravimetric",
+    "charge_capacity_loss_gravimetric",
+    "cumulated_discharge_capacity_loss_gravimetric",
+    "cumulated_charge_capacity_loss_gravimetric",
+    "shifted_charge_capacity_gravimetric",
+    "shifted_discharge_capacity_gravimetric",
+    "discharge_capacity_areal",
+    "charge_capacity_areal",
+    "cumulated_charge_capacity_areal",
+    "cumulated_discharge_capacity_areal",
+    "coulombic_difference_areal",
+    "cumulated_coulombic_difference_areal",
+    "discharge_capacity_loss_areal",
+    "charge_capacity_loss_areal",
+    "cumulated_discharge_capacity_loss_areal",
+    "cumulated_charge_capacity_loss_areal",
+    "shifted_charge_capacity_areal",
+    "shifted_discharge_capacity_areal",
+]
 
 
 def delete_file(file_name):
@@ -22,49 +111,146 @@ def delete_file(file_name):
         logging.debug("error while deleting file...")
 
 
+def _uses_native_reader(native_reader, cellpy_instrument, model, cellpy_kwargs):
+    from .maccor import MODELS as MACCOR_MODELS
+
+    # other keyword arguments are only understood by cellpy.get
+    return bool(
+        native_reader
+        and cellpy_instrument == "maccor_txt"
+        and model in MACCOR_MODELS
+        and set(cellpy_kwargs) <= {"auto_summary"}
+    )
+
+
+def reads_bytes(data_converter, **kwargs):
+    """Check if the converter reads the content of a file (bytes) with these arguments.
+
+    The others only read files (the server stages the upload in a file for them).
+    """
+
+    if data_converter != "cellpy":
+        return True
+    cellpy_instrument, model = _cellpy_instruments(
+        kwargs.get("instrument"), kwargs.get("test_type"), kwargs.get("extension")
+    )
+    return _uses_native_reader(
+        kwargs.get("native_reader", NATIVE_MACCOR_READER),
+        cellpy_instrument,
+        model,
+        [key for key in kwargs if key not in CELLPY_OPTIONS],
+    )
+
+
+@contextlib.contextmanager
+def _as_file(source, extension):
+    """The path of the source, the content of a file (bytes) is written to a temporary file.
+
+    (The server stages uploads in a file for converters that do not read bytes, see
+    reads_bytes, this is for other callers.)
+    """
+
+    if not is_buffer(source):
+        yield source
+        return
+    fd, path = tempfile.mkstemp(suffix=f".{extension.lower()}", prefix=STAGED_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        delete_file(path)
+
+
+def _selected(projection, table):
+    """Check if the table ("data" or "summary") is selected by the projection."""
+
+    return projection is None or table in projection["tables"]
+
+
+def _project(df, projection, table, default_columns=None):
+    """Select the columns of the table requested in the projection (unknown columns are ignored)."""
+
+    columns = default_columns
+    if projection is not None and projection["columns"].get(table):
+        columns = projection["columns"][table]
+    if columns is None:
+        return df
+    return df[[column for column in columns if column in df.columns]]
+
+
+def _drop_unselected(result, projection):
+    """Remove the tables that are not selected by the projection from the result."""
+
+    for table, key in [("data", "experiment_data"), ("summary", "experiment_summary")]:
+        if not _selected(projection, table):
+            result.pop(key, None)
+
+
+def prewarm():
+    """Import all converter backends (instead of on first use)."""
+
+    for module in BACKEND_MODULES:
+        importlib.import_module(module, __package__)
+    logging.debug(f"imported {len(BACKEND_MODULES)} backend modules")
+
+
+def _database_error():
+    """psycopg2.Error, imported when an exception is matched."""
+    from psycopg2 import Error
+
+    return Error
+
+
+def _compact_result(result):
+    """Downcast the frames of the result (see compact.py) and report the saved bytes."""
+    import pandas as pd
+
+    from .compact import compact_frame
+
+    saved = 0
+    for key in ["experiment_data", "experiment_summary"]:
+        if isinstance(result.get(key), pd.DataFrame):
+            result[key], saved_bytes = compact_frame(result[key])
+            saved += saved_bytes
+    result["compact"] = {"saved_bytes": saved}
+
+
 def transform_data_galvani(file_name, **kwargs):
-    """Use Galvani to convert BioLogic .mpr files"""
+    """Convert BioLogic .mpr files (memory-mapped, with the column layout from galvani)"""
+    from .biologic import read_mpr
+
+    projection = kwargs.pop("projection", None)
+    compact = kwargs.pop("compact", False)
+    kwargs.pop("parse_workers", None)
 
     try:
-        mpr_file = BioLogic.MPRfile(rf"{file_name}")
-        df = pd.DataFrame(mpr_file.data)
-        df = df.iloc[0:5, :]
-        out_cv_biologicmpr = json.loads(df.to_json(orient="split"))
+        df, info = read_mpr(file_name)
+        df = _project(df, projection, "data")
         xx = {
-            "experiment_info": {
-                "test type performed": "Voltammetry",
-                "Run on channel": "6 (SN 14887)",
-                "Electrode connection": "standard",
-                "Ewe ctrl range": "min = 0.00 V, max = 5.00 V",
-                "Acquisition started on": "06/16/2016 11:52:12.000",
-                "Loaded Setting File": "NONE",
-                "Saved on": " none ",
-                "File": "none ",
-                "Device": "VMP3 (SN 0711)",
-            },
-            "experiment_data": out_cv_biologicmpr,
+            "experiment_info": info,
+            "experiment_data": df,
         }
-        delete_file(file_name)
+        _drop_unselected(xx, projection)
+        if compact:
+            _compact_result(xx)
         return True, xx
-    except Error as err:
+    except _database_error() as err:
         return False, err
 
 
 def transform_data_xrd(file_name, **kwargs):
     """Convert x-ray diffraction file."""
+    from .xrd import read_xrd
 
-    try:
-        df = pd.read_csv(
-            file_name,
-            sep=r"\s+",
-            engine="python",
-            header=0,
-            index_col=False,
-        )
-        df.columns = ["2theta", "intensity"]
-        df["intensity"] = df["intensity"] / max(df["intensity"])
+    projection = kwargs.pop("projection", None)
+    compact = kwargs.pop("compact", False)
+    parse_workers = kwargs.pop("parse_workers", 1)
 
-        out_xrd = json.loads(df.to_json(orient="split"))
+    try:
+        df = read_xrd(file_name, workers=parse_workers)
+        scans = int(df["scan"].max()) + 1 if "scan" in df else 1
+        df = _project(df, projection, "data")
 
         # the json structure, four arrays in 1 json object.
         # The experiment_info array might become bigger. We might want to read-out more data from the .res file.
@@ -75,18 +261,21 @@ def transform_data_xrd(file_name, **kwargs):
                 "X-ray tube": "unknown",
                 "Position sensitive detector": "unknown",
                 "Spinning/non-spinning": "unknown",
+                "scans": scans,
             },
-            "experiment_data": out_xrd,
+            "experiment_data": df,
         }
+        _drop_unselected(xx, projection)
+        if compact:
+            _compact_result(xx)
 
-        delete_file(file_name)
         return True, xx
-    except Error as err:
+    except _database_error() as err:
         return False, err
 
 
 def _clean_up_non_unicode_file(file_name):
-    """Clean up non-unicode file."""
+    """Clean up non-unicode file (for files that were not transcoded while uploading)."""
     with open(file_name, "r", encoding="utf-8", errors="replace") as f:
         lines = f.readlines()
     with open(file_name, "w", encoding="utf-8") as f:
@@ -152,12 +341,131 @@ def _cellpy_instruments(instrument, test_type, extension):
     return cellpy_instrument, data_format_model
 
 
+def _resume_step_table(c, steps, resumed_rows):
+    """Make the step table of the cell from the steps of a checkpoint (see maccor.py).
+
+    The steps of the cycles before the last cycle of the first resumed_rows raw rows are
+    taken from steps, the others are made from the raw data. The table is the same as
+    the one made from all rows. Returns False if the steps can not be used.
+    """
+    import pandas as pd
+
+    raw = c.data.raw
+    nhdr = c.headers_normal
+    shdr = c.headers_step_table
+    if steps is None or "index" not in steps or not 0 < resumed_rows < len(raw):
+        return False
+    cycles = raw[nhdr.cycle_index_txt]
+    points = raw[nhdr.data_point_txt]
+    if not (cycles.is_monotonic_increasing and points.is_monotonic_increasing):
+        return False
+
+    cycle = cycles.iat[resumed_rows - 1]
+    first_point = points.iat[cycles.searchsorted(cycle)]
+    old = steps.loc[
+        (steps[shdr.cycle] < cycle) & (steps[f"{shdr.point}_last"] < first_point)
+    ]
+    before = raw.loc[points < first_point]
+    groups = before.groupby([nhdr.cycle_index_txt, nhdr.step_index_txt]).ngroups
+    if groups != len(old):
+        return False
+
+    # the rows in the order of the groups (cycle, step), sorted by time like cellpy does
+    new = c.make_step_table(from_data_point=first_point)
+    merged = pd.concat(
+        [
+            old.sort_values("index").drop(columns="index"),
+            new.sort_values("index").drop(columns="index"),
+        ],
+        ignore_index=True,
+    ).astype(new.dtypes.drop("index").to_dict())
+    c.data.steps = merged.sort_values(by=f"{shdr.test_time}_first").reset_index()
+    logging.debug(f"step table resumed at cycle {cycle}: {len(new)} of {len(merged)} steps")
+    return True
+
+
+def _native_maccor_cell(
+    file_name,
+    model,
+    projection=None,
+    auto_summary=True,
+    parse_workers=1,
+    resume=None,
+    checkpoint=None,
+    encoding=None,
+):
+    """Create a cellpy cell from a Maccor txt file read with the native reader.
+
+    With a checkpoint (a dict), the parsed rows and the step table are stored in it, a
+    previous checkpoint of the (growing) file can be resumed (see read_maccor_txt).
+    """
+    import pandas as pd
+    from cellpy.readers import core
+    from cellpy.readers.cellreader import CellpyCell
+
+    from .maccor import read_maccor_txt
+
+    columns = None
+    if projection is not None and projection["columns"].get("data"):
+        columns = projection["columns"]["data"]
+    if resume is not None and checkpoint is None:
+        checkpoint = {}
+    raw = read_maccor_txt(
+        file_name,
+        model,
+        columns,
+        workers=parse_workers,
+        resume=resume,
+        checkpoint=checkpoint,
+        encoding=encoding,
+    )
+
+    # the same as cellpy.get does for the raw data from the maccor_txt loader
+    c = CellpyCell()
+    c.set_instrument(instrument="maccor_txt", model=model)
+    data = core.Data()
+    file_name = None if is_buffer(file_name) else file_name
+    data.loaded_from = file_name
+    data.raw_data_files.append(core.FileID(file_name))
+    data.raw_data_files_length.append(len(raw))
+    data.raw = raw
+    data.summary = pd.DataFrame()
+    data = core.identify_last_data_point(data)
+    data.start_datetime = raw["date_time"].iat[0]
+    data.raw_units = c._set_raw_units()
+    c.data = data
+
+    if auto_summary:
+        resumed_rows = checkpoint.get("resumed_rows", 0) if checkpoint else 0
+        if not (
+            resumed_rows and _resume_step_table(c, resume.get("steps"), resumed_rows)
+        ):
+            c.make_step_table()
+        # the summary (with the cumulated columns) is cheap compared to the step table
+        c.make_summary()
+    if checkpoint is not None:
+        checkpoint["steps"] = c.data.steps if auto_summary else None
+    return c
+
+
 def transform_data_cellpy(file_name, **kwargs):
     """Use cellpy to convert cell cycling files"""
+    import cellpy
+
     instrument = kwargs.pop("instrument", None)
     test_type = kwargs.pop("test_type", None)
     extension = kwargs.pop("extension", None)
     model = kwargs.pop("data_format_model", None)
+    projection = kwargs.pop("projection", None)
+    native_reader = kwargs.pop("native_reader", NATIVE_MACCOR_READER)
+    compact = kwargs.pop("compact", False)
+    parse_workers = kwargs.pop("parse_workers", 1)
+    # the upload was already transcoded to UTF-8 while it was spooled
+    transcoded = kwargs.pop("transcoded", False)
+    # for files that are still growing: store a checkpoint (as "_checkpoint") in the
+    # result, resume the checkpoint of an earlier version of the file
+    append = kwargs.pop("append", False)
+    resume = kwargs.pop("resume", None)
     logging.debug("transform_data_cellpy")
 
     if model:
@@ -179,25 +487,49 @@ def transform_data_cellpy(file_name, **kwargs):
     )
 
     cellpy_instrument, model = _cellpy_instruments(instrument, test_type, extension)
-    if model == "S4000-KIT":
-        logging.debug("Using S4000-KIT model")
-        logging.debug("Note (2024.04.28): these files seems to always contain non-unicode characters")
-        logging.debug("Performing a clean-up of the file")
-        _clean_up_non_unicode_file(file_name)
+    if not _selected(projection, "summary"):
+        # no need for cellpy to create the step table and summary
+        kwargs["auto_summary"] = False
+    native_reader = _uses_native_reader(native_reader, cellpy_instrument, model, kwargs)
 
-    try:
-        logging.debug("Running cellpy")
-        logging.debug(
-            f"cellpy.get(filename= {file_name}, "
-            f"instrument= {cellpy_instrument}, "
-            f"model={model}, kwargs: {kwargs})"
-        )
+    checkpoint = {} if native_reader and (append or resume is not None) else None
 
-        c = cellpy.get(
-            filename=file_name, instrument=cellpy_instrument, model=model, **kwargs
-        )
+    try:
+        if native_reader:
+            logging.debug(f"Running the native reader for {model}")
+            c = _native_maccor_cell(
+                file_name,
+                model,
+                projection,
+                kwargs.get("auto_summary", True),
+                parse_workers,
+                resume,
+                checkpoint,
+                "utf-8" if transcoded else None,
+            )
+        else:
+            # cellpy only reads files
+            with _as_file(file_name, extension) as file_name:
+                if model == "S4000-KIT" and not transcoded:
+                    logging.debug("Using S4000-KIT model")
+                    logging.debug("Note (2024.04.28): these files seems to always contain non-unicode characters")
+                    logging.debug("Performing a clean-up of the file")
+                    _clean_up_non_unicode_file(file_name)
+                logging.debug("Running cellpy")
+                logging.debug(
+                    f"cellpy.get(filename= {file_name}, "
+                    f"instrument= {cellpy_instrument}, "
+                    f"model={model}, kwargs: {kwargs})"
+                )
+                c = cellpy.get(
+                    filename=file_name,
+                    instrument=cellpy_instrument,
+                    model=model,
+                    **kwargs,
+                )
         data = c.data
         df_raw = data.raw
+        df_sum = data.summary if _selected(projection, "summary") else None
 
         df_raw[
             [
@@ -220,71 +552,17 @@ def transform_data_cellpy(file_name, **kwargs):
                 * 1  # needs to be changed for Arbin
         )
 
-        df_sum = data.summary
-        df_sum["cycle_index"] = df_sum.index
-        df_sum = df_sum[[
-            "cycle_index",
-            "data_point",
-            "test_time",
-            "date_time",
-            "end_voltage_charge",
-            "end_voltage_discharge",
-            "charge_capacity",
-            "discharge_capacity",
-            "coulombic_efficiency",
-            "cumulated_coulombic_efficiency",
-            "cumulated_charge_capacity",
-            "cumulated_discharge_capacity",
-            "discharge_capacity_loss",
-            "charge_capacity_loss",
-            "coulombic_difference",
-            "cumulated_coulombic_difference",
-            "cumulated_discharge_capacity_loss",
-            "cumulated_charge_capacity_loss",
-            "shifted_charge_capacity",
-            "shifted_discharge_capacity",
-            "cumulated_ric",
-            "cumulated_ric_sei",
-            "cumulated_ric_disconnect",
-            "normalized_cycle_index",
-            "charge_c_rate",
-            "discharge_c_rate",
-            "discharge_capacity_gravimetric",
-            "charge_capacity_gravimetric",
-            "cumulated_charge_capacity_gravimetric",
-            "cumulated_discharge_capacity_gravimetric",
-            "coulombic_difference_gravimetric",
-            "cumulated_coulombic_difference_gravimetric",
-            "discharge_capacity_loss_gravimetric",
-            "charge_capacity_loss_gravimetric",
-            "cumulated_discharge_capacity_loss_gravimetric",
-            "cumulated_charge_capacity_loss_gravimetric",
-            "shifted_charge_capacity_gravimetric",
-            "shifted_discharge_capacity_gravimetric",
-            "discharge_capacity_areal",
-            "charge_capacity_areal",
-            "cumulated_charge_capacity_areal",
-            "cumulated_discharge_capacity_areal",
-            "coulombic_difference_areal",
-            "cumulated_coulombic_difference_areal",
-            "discharge_capacity_loss_areal",
-            "charge_capacity_loss_areal",
-            "cumulated_discharge_capacity_loss_areal",
-            "cumulated_charge_capacity_loss_areal",
-            "shifted_charge_capacity_areal",
-            "shifted_discharge_capacity_areal",
-        ]]
-
-        df_sum[["charge_capacity", "discharge_capacity"]] = (
-                df_sum[["charge_capacity", "discharge_capacity"]] * 1  # needs to be changed for arbin
-        )
-        out_summary = json.loads(
-            df_sum.to_json(orient="split")
-        )  # change  df_sum_small when you want to see the structure
-        out_raw = json.loads(
-            df_raw.to_json(orient="split")
-        )  # change  df_raw_small when you want to see the structure
+        if df_sum is not None:
+            df_sum["cycle_index"] = df_sum.index
+            df_sum[["charge_capacity", "discharge_capacity"]] = (
+                    df_sum[["charge_capacity", "discharge_capacity"]] * 1  # needs to be changed for arbin
+            )
+            df_sum = _project(df_sum, projection, "summary", SUMMARY_COLUMNS)
+
+        df_raw = _project(df_raw, projection, "data")
 
+        # the frames are kept as they are, they are serialized (in split orientation)
+        # while writing the response (see responses.py).
         # the json structure, four arrays in 1 json object.
         # The experiment_info array might become bigger. We might want to read-out more
         # data from the .res file. The auxiliary table, if existing, will be as long as
@@ -305,7 +583,7 @@ def transform_data_cellpy(file_name, **kwargs):
                 "channel_number": channel_index,
                 "schedule_file_name": schedule_file_name,
             },
-            "experiment_summary": out_summary,
+            "experiment_summary": df_sum,
             "auxiliary_table": {
                 "columns": ["test_time", "date_time"],
                 "index": [1, 2, 3],
@@ -315,44 +593,58 @@ def transform_data_cellpy(file_name, **kwargs):
                     [29256.6799169249, 1572467675000],
                 ],
             },
-            "experiment_data": out_raw,
+            "experiment_data": df_raw,
         }
-        delete_file(file_name)
+        _drop_unselected(xx, projection)
+        if compact:
+            _compact_result(xx)
+        if checkpoint is not None:
+            xx["_checkpoint"] = checkpoint
         return True, xx
-    except Error as err:
+    except _database_error() as err:
         return False, err
 
 
-# TODO: move all the methods and functions not directly related to the data conversion to a separate module.
-def insert_value(json_value):
-    """Add JSON to PostgreSQL."""
-    try:
-        # Connect to an existing database
-        connection = psycopg2.connect(
-            user="postgres",
-            password="postgres",
-            host="127.0.0.1",
-            port="5432",
-            database="flask_db",
+def backend_versions():
+    """Versions of leafspy and the libraries used for the conversions."""
+
+    versions = {"converter": CONVERTER_VERSION}
+    for package in ["cellpy", "galvani", "pandas"]:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def conversion_fingerprint(data_converter, instrument, test_type, extension, **kwargs):
+    """Everything besides the file content that determines the conversion result."""
+
+    fingerprint = {
+        "data_converter": data_converter,
+        "instrument": instrument,
+        "test_type": test_type,
+        "extension": extension,
+        "kwargs": kwargs,
+    }
+    if data_converter == "cellpy":
+        fingerprint["cellpy_instrument"], fingerprint["model"] = _cellpy_instruments(
+            instrument, test_type, extension
         )
+    return fingerprint
+
 
-        # Create a cursor to perform database operations
-        cursor = connection.cursor()
-        # Print PostgreSQL details
-        print("PostgreSQL server information")
-        print(connection.get_dsn_parameters(), "\n")
-        # Executing a SQL query
-        my_json = json.dumps(json_value)
-        cursor.execute(f"INSERT into test(name, value) VALUES('test_1', '{my_json}')")
-        # Fetch result
-
-        connection.commit()
-        # close communication with the database
-        cursor.close()
+def insert_value(json_value, store=None):
+    """Add JSON to the (PostgreSQL) database."""
+    # kept for backwards compatibility, see persistence.py for storing conversion results
+    from .persistence import get_store
+
+    try:
+        (store or get_store()).insert_value("test_1", json_value)
         return True
 
-    except (Exception, Error) as error:
-        print("Error while connecting to PostgreSQL", error)
+    except Exception as error:
+        logging.debug(f"Error while inserting into the database: {error}")
         return False
 
 
@@ -362,5 +654,45 @@ functions = {
     "xrd_custom": transform_data_xrd,
 }
 
+
+def convert_file(
+    data_converter,
+    file_name,
+    pyramid=True,
+    parse_workers=1,
+    trace_memory=False,
+    **kwargs,
+):
+    """Convert a file with one of the functions and post-process the result.
+
+    file_name is the path of the file or its content (bytes), the converters that can
+    not read bytes write them to a temporary file. If pyramid is True, the downsampling
+    levels of the experiment data are computed and stored (as "_pyramid") in the
+    result. Large text files are parsed with parse_workers processes (if supported by
+    the converter). The time spent in the converter is stored as "_convert_seconds",
+    with trace_memory the peak of the (traced) allocations of the converter as
+    "_memory_peak". The cellpy converter stores a checkpoint of a growing Maccor txt
+    file as "_checkpoint" (with append=True) and only parses the appended rows when it
+    resumes one (resume=<checkpoint>).
+    """
+    import pandas as pd
+
+    from .downsampling import build_pyramid
+
+    memory = {}
+    started = time.perf_counter()
+    with profiling.trace_memory(memory) if trace_memory else contextlib.nullcontext():
+        success, data = functions[data_converter](
+            file_name, parse_workers=parse_workers, **kwargs
+        )
+    if success:
+        data["_convert_seconds"] = time.perf_counter() - started
+        if trace_memory:
+            data["_memory_peak"] = memory["peak"]
+    if success and pyramid and isinstance(data.get("experiment_data"), pd.DataFrame):
+        data["_pyramid"] = build_pyramid(data["experiment_data"])
+    return success, data
+
+
 if __name__ == "__main__":
     print(transform_data_galvani(r"./uploads/example_cv.mpr"))
@@ -0,0 +1,142 @@
+"""Shape preserving downsampling (Largest-Triangle-Three-Buckets) of measured curves."""
+
+import numpy as np
+
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_POINTS = 1000
+
+# columns used for plotting, first match is used as x, all matches as y
+X_COLUMNS = ["test_time", "time/s", "2theta"]
+Y_COLUMNS = [
+    "voltage",
+    "current",
+    "Ewe/V",
+    "I/mA",
+    "<I>/mA",
+    "control/V/mA",
+    "intensity",
+]
+
+
+def lttb(x, y, n_out):
+    """Indices of the n_out points of (x, y) selected with Largest-Triangle-Three-Buckets.
+
+    This is the vectorized variant of LTTB: the first point of the triangle is the
+    average of the previous bucket (instead of the point selected in the previous
+    bucket), so all buckets are handled in one NumPy pass. The first and last point
+    are always kept.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # bucket i contains the points edges[i]:edges[i + 1], the first and last point are
+    # buckets of their own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[: n - 1], starts) / counts
+    avg_y = np.add.reduceat(np.nan_to_num(y[: n - 1]), starts) / counts
+
+    a_x = np.concatenate([[x[0]], avg_x[:-1]])
+    a_y = np.concatenate([[y[0]], avg_y[:-1]])
+    c_x = np.concatenate([avg_x[1:], [x[-1]]])
+    c_y = np.concatenate([avg_y[1:], [y[-1]]])
+
+    bucket = np.repeat(np.arange(len(starts)), counts)
+    points = slice(1, n - 1)
+    area = np.abs(
+        (a_x[bucket] - c_x[bucket]) * (y[points] - a_y[bucket])
+        - (a_x[bucket] - x[points]) * (c_y[bucket] - a_y[bucket])
+    )
+    area = np.nan_to_num(area, nan=-1.0)
+
+    # first point with the largest area in each bucket
+    largest = np.maximum.reduceat(area, starts - 1)
+    candidates = np.flatnonzero(area == largest[bucket])
+    candidate_bucket = bucket[candidates]
+    first = np.concatenate([[True], candidate_bucket[1:] != candidate_bucket[:-1]])
+    selected = candidates[first] + 1
+
+    return np.concatenate([[0], selected, [n - 1]])
+
+
+def _downsample(x, ys, n_out):
+    """Union of the LTTB selections for each of the y columns."""
+
+    return np.unique(np.concatenate([lttb(x, y, n_out) for y in ys]))
+
+
+def plot_columns(df):
+    """The x and y columns of a frame used for the downsampling (x is None if unknown)."""
+
+    x = next((c for c in X_COLUMNS if c in df.columns), None)
+    ys = [c for c in Y_COLUMNS if c in df.columns]
+    if not ys:
+        x = None
+    return x, ys
+
+
+def build_pyramid(df, factor=PYRAMID_FACTOR, min_points=PYRAMID_MIN_POINTS):
+    """Precompute downsampled resolution levels of a frame.
+
+    Returns None if the frame has no known plot columns, otherwise a dict with the
+    x and y column names and "levels": positional row indices of the levels,
+    from fine to coarse. Each level is the LTTB selection (per y column) of the
+    previous level with 1/factor of the points.
+    """
+
+    x_name, y_names = plot_columns(df)
+    if x_name is None:
+        return None
+
+    x = df[x_name].to_numpy(dtype=np.float64)
+    ys = [df[y].to_numpy(dtype=np.float64) for y in y_names]
+
+    levels = []
+    current = np.arange(len(df))
+    while len(current) // factor >= min_points:
+        selected = _downsample(
+            x[current], [y[current] for y in ys], len(current) // factor
+        )
+        current = current[selected]
+        levels.append(current)
+
+    return {"x": x_name, "y": y_names, "levels": levels}
+
+
+def select_rows(df, pyramid, max_points, start=None, end=None):
+    """Positional indices of at most max_points rows of df within the x window [start, end].
+
+    The coarsest pyramid level with at least max_points rows in the window is used and
+    reduced to (about) max_points with LTTB.
+    """
+
+    x = df[pyramid["x"]].to_numpy(dtype=np.float64)
+
+    def in_window(rows):
+        mask = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            mask &= x[rows] >= start
+        if end is not None:
+            mask &= x[rows] <= end
+        return rows[mask]
+
+    candidates = in_window(np.arange(len(df)))
+    for level in reversed(pyramid["levels"]):
+        rows = in_window(level)
+        if len(rows) >= max_points:
+            candidates = rows
+            break
+
+    if len(candidates) <= max_points:
+        return candidates
+    selected = _downsample(
+        x[candidates],
+        [df[y].to_numpy(dtype=np.float64)[candidates] for y in pyramid["y"]],
+        max(max_points // len(pyramid["y"]), 3),
+    )
+    return candidates[selected]
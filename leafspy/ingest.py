@@ -0,0 +1,389 @@
+"""Streaming ingest of uploaded (compressed) files."""
+
+import bz2
+import codecs
+import contextlib
+import gzip
+import logging
+import lzma
+import os
+import queue
+import threading
+import time
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# compressed bytes read at a time while peeking at the start of an upload
+PEEK_CHUNK_SIZE = 16 * 1024
+# The compression ratio is only checked after this many decompressed bytes, small files
+# (e.g. a header-only file) can legitimately have very high ratios.
+RATIO_CHECK_THRESHOLD = 16 * 1024 * 1024
+
+
+# compressed uploads: file suffix -> compression (the compression of the data is
+# detected from the magic bytes, the suffix is only used if these are not recognized)
+COMPRESSION_SUFFIXES = {
+    ".gz": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".xz": "xz",
+    ".bz2": "bz2",
+}
+COMPRESSION_MAGICS = {
+    "gzip": b"\x1f\x8b",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "xz": b"\xfd7zXZ\x00",
+    "bz2": b"BZh",
+}
+# zstd frames can have windows of up to 2**ZSTD_WINDOW_LOG_MAX bytes (zstd --long uses
+# 2**27, --long=30 the maximum accepted here), the decompressor needs memory for the
+# whole window
+ZSTD_WINDOW_LOG_MAX = 30
+# decompressed chunks a read-ahead thread can be in front of the reader
+READ_AHEAD_CHUNKS = 4
+
+# byte order marks recognized with encoding="auto" (longest first)
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+class DecompressionLimitError(Exception):
+    """The decompressed upload exceeds one of the configured limits."""
+
+
+class CompressedDataError(OSError):
+    """The upload is not valid data of its compression."""
+
+
+class UnsupportedCompressionError(Exception):
+    """The compression of the upload is not supported (or its module is missing)."""
+
+
+class _Reader:
+    """Base of the stream wrappers (readinto for python-isal, based on read)."""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class _CountingReader(_Reader):
+    """Wrap a binary stream and keep track of the number of bytes read from it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class _ReplayReader(_Reader):
+    """Read the chunks that were already taken from a stream, then the rest of it."""
+
+    def __init__(self, chunks, stream):
+        self.buffer = b"".join(chunks)
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.buffer:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.buffer = self.buffer + self.stream.read(), b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def detect_compression(head):
+    """The compression of data starting with head (None if it is not recognized)."""
+
+    for compression, magic in COMPRESSION_MAGICS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+class _ReadAheadReader:
+    """Read chunks of a file object in a background thread.
+
+    Decompressors release the GIL, so the decompression of the next chunks overlaps
+    with the processing (hashing, transcoding and writing) of the current one.
+    """
+
+    def __init__(self, f, chunk_size, depth=READ_AHEAD_CHUNKS):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.buffer = b""
+        self.done = False
+        self.thread = threading.Thread(target=self._read_ahead, daemon=True)
+        self.thread.start()
+
+    def _read_ahead(self):
+        try:
+            while not self.stopped.is_set():
+                chunk = self.f.read(self.chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as err:
+            self._put(err)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or len(self.buffer) < size):
+            item = self.chunks.get()
+            if isinstance(item, BaseException):
+                self.done = True
+                raise item
+            if not item:
+                self.done = True
+            self.buffer += item
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_decompressed(fileobj, compression, threads=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """A file object with the decompressed data of fileobj.
+
+    With threads, the data is decompressed in a background thread (gzip with the
+    threaded reader of python-isal if it is installed). python-isal is also used for
+    single threaded gzip decompression, zstd needs the zstandard package (and accepts
+    long-window frames up to ZSTD_WINDOW_LOG_MAX). Raises UnsupportedCompressionError
+    if the compression can not be decompressed.
+    """
+
+    if compression == "gzip":
+        try:
+            from isal import igzip, igzip_threaded
+        except ImportError:
+            f = gzip.GzipFile(fileobj=fileobj, mode="rb")
+        else:
+            if threads:
+                return igzip_threaded.open(fileobj, "rb", threads=threads)
+            return igzip.GzipFile(fileobj=fileobj, mode="rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise UnsupportedCompressionError("zstd uploads need the zstandard package")
+        f = zstandard.ZstdDecompressor(
+            max_window_size=2**ZSTD_WINDOW_LOG_MAX
+        ).stream_reader(fileobj, read_size=PEEK_CHUNK_SIZE, closefd=False)
+    elif compression == "xz":
+        f = lzma.LZMAFile(fileobj, "rb")
+    elif compression == "bz2":
+        f = bz2.BZ2File(fileobj, "rb")
+    else:
+        raise UnsupportedCompressionError(f"Unknown compression {compression}")
+    return _ReadAheadReader(f, chunk_size) if threads else f
+
+
+def _decompression_errors():
+    """The exceptions (besides OSError and EOFError) of the decompressors."""
+
+    errors = [lzma.LZMAError]
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        errors.append(zstandard.ZstdError)
+    return tuple(errors)
+
+
+class _RecordingReader(_Reader):
+    """Keep the chunks read from a stream (to replay them with _ReplayReader)."""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.chunks = []
+
+    def read(self, size=-1):
+        size = self.chunk_size if size < 0 else min(size, self.chunk_size)
+        chunk = self.stream.read(size)
+        self.chunks.append(chunk)
+        return chunk
+
+
+def peek_compressed(
+    stream, size, compression=None, default=None, chunk_size=PEEK_CHUNK_SIZE
+):
+    """The first size decompressed bytes of a compressed stream (without seeking).
+
+    If the compression is not given, it is detected from the magic bytes (default is
+    used if they are not recognized). Returns the compression, the bytes and a stream
+    that reads the compressed stream from the start. Raises UnsupportedCompressionError
+    if the compression is not known and an OSError (e.g. CompressedDataError) if the
+    data is not valid.
+    """
+
+    magic = stream.read(max(len(m) for m in COMPRESSION_MAGICS.values()))
+    stream = _ReplayReader([magic], stream)
+    compression = compression or detect_compression(magic) or default
+    if compression is None:
+        raise UnsupportedCompressionError("Unknown compression")
+
+    recording = _RecordingReader(stream, chunk_size)
+    try:
+        f = open_decompressed(recording, compression)
+        head = b""
+        while len(head) < size:
+            chunk = f.read(size - len(head))
+            if not chunk:
+                break
+            head += chunk
+    except EOFError:
+        # the beginning of a (short) file can be decompressed without its end
+        pass
+    except _decompression_errors() as err:
+        raise CompressedDataError(str(err)) from err
+    return compression, head, _ReplayReader(recording.chunks, stream)
+
+
+def spool_compressed(
+    stream,
+    location,
+    compression="gzip",
+    threads=0,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_size=None,
+    max_ratio=None,
+    digest=None,
+    encoding=None,
+    stats=None,
+):
+    """Decompress a compressed stream chunk by chunk into the file at location.
+
+    location can also be a writable object (e.g. a staged upload), it is not closed.
+    Returns the number of decompressed bytes. Raises DecompressionLimitError
+    (and removes the partially written file) if max_size or max_ratio is exceeded.
+    If a hashlib object is given as digest, it is updated with the decompressed data.
+    If an encoding is given ("auto" to detect it from the byte order mark, UTF-8
+    otherwise), the data is transcoded to UTF-8 while it is written, bytes that are
+    invalid in the encoding are replaced with U+FFFD. If a dict is given as stats, the
+    compressed size and the seconds spent decompressing and writing are stored in it.
+    With threads, the data is decompressed in a background thread (see
+    open_decompressed).
+    """
+
+    compressed = _CountingReader(stream)
+    written = 0
+    decoder = None
+    started = time.perf_counter()
+    decompressing = 0.0
+    try:
+        with open_decompressed(
+            compressed, compression, threads, chunk_size
+        ) as f_in, _output(location) as f_out:
+            while True:
+                read_started = time.perf_counter()
+                chunk = f_in.read(chunk_size)
+                decompressing += time.perf_counter() - read_started
+                if not chunk:
+                    break
+                written += len(chunk)
+                _check_limits(written, compressed.bytes_read, max_size, max_ratio)
+                if digest is not None:
+                    digest.update(chunk)
+                if encoding is None:
+                    f_out.write(chunk)
+                    continue
+                if decoder is None:
+                    decoder = _decoder(encoding, chunk)
+                f_out.write(decoder.decode(chunk).encode("utf-8"))
+            if decoder is not None:
+                f_out.write(decoder.decode(b"", final=True).encode("utf-8"))
+    except (DecompressionLimitError, OSError, EOFError):
+        _remove_partial(location)
+        raise
+    except _decompression_errors() as err:
+        _remove_partial(location)
+        raise CompressedDataError(str(err)) from err
+
+    if stats is not None:
+        stats["compressed_bytes"] = compressed.bytes_read
+        stats["decompress_seconds"] = decompressing
+        stats["write_seconds"] = time.perf_counter() - started - decompressing
+    logging.debug(
+        f"spooled {compressed.bytes_read} compressed bytes -> {written} bytes to {location}"
+    )
+    return written
+
+
+def detect_encoding(head):
+    """The encoding of data starting with head (from the byte order mark, UTF-8 otherwise)."""
+
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(mark):
+            return encoding
+    return "utf-8"
+
+
+def _decoder(encoding, head):
+    if encoding == "auto":
+        encoding = detect_encoding(head)
+        logging.debug(f"detected encoding {encoding}")
+    return codecs.getincrementaldecoder(encoding)(errors="replace")
+
+
+def _check_limits(written, compressed_size, max_size, max_ratio):
+    if max_size and written > max_size:
+        raise DecompressionLimitError(
+            f"Decompressed file is larger than the allowed {max_size} bytes"
+        )
+    if max_ratio and written > RATIO_CHECK_THRESHOLD:
+        ratio = written / max(compressed_size, 1)
+        if ratio > max_ratio:
+            raise DecompressionLimitError(
+                f"Compression ratio exceeds the allowed {max_ratio}:1"
+            )
+
+
+def _output(location):
+    if hasattr(location, "write"):
+        return contextlib.nullcontext(location)
+    return open(location, "wb")
+
+
+def _remove_partial(location):
+    if hasattr(location, "write"):
+        return
+    try:
+        os.remove(location)
+    except OSError:
+        logging.debug(f"could not remove partially spooled file {location}")
@@ -0,0 +1,235 @@
+"""Asynchronous conversion jobs running in a process pool."""
+
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class JobQueueFull(Exception):
+    """There are already too many jobs waiting to be processed."""
+
+
+class Job:
+    """A function call submitted to the job manager."""
+
+    def __init__(self, job_id, **extra):
+        self.job_id = job_id
+        self.extra = extra
+        self.future = None
+        self.submitted = time.time()
+        self.finished = None
+        self.success = None
+        self.data = None
+        self.error = None
+        self.attempts = 0
+        self.done = threading.Event()
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return "done" if self.success else "failed"
+        if self.future is not None and self.future.running():
+            return "running"
+        return "queued"
+
+
+class JobManager:
+    """Run conversions in a bounded ProcessPoolExecutor and keep track of them.
+
+    At most ``max_queued`` jobs can be unfinished at the same time, finished jobs are
+    kept for ``result_ttl`` seconds (at most ``max_results`` of them, the oldest are
+    removed first). initializer (picklable) is called in each worker process when it
+    is started. If a worker dies (e.g. killed when it runs out of memory), the pool is
+    replaced and the jobs that were lost with it are submitted again (``retries`` times).
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        max_queued=32,
+        result_ttl=3600,
+        initializer=None,
+        max_results=256,
+        retries=1,
+    ):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.retries = retries
+        self.jobs = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """The process pool (started on first use)."""
+
+        with self._lock:
+            if self._executor is None:
+                # spawn instead of fork: the server process is multithreaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                )
+            return self._executor
+
+    def _replace_executor(self, executor):
+        """Drop a broken process pool, the next job starts a new one."""
+
+        with self._lock:
+            if self._executor is not executor:
+                return
+            logging.warning("a worker of the job pool died, starting a new pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _unfinished(self):
+        return sum(job.finished is None for job in self.jobs.values())
+
+    def _prune(self):
+        limit = time.time() - self.result_ttl
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished is not None),
+            key=lambda job: job.finished,
+        )
+        excess = len(finished) - self.max_results
+        for index, job in enumerate(finished):
+            if index < excess or job.finished < limit:
+                del self.jobs[job.job_id]
+
+    def _new_job(self, **extra):
+        with self._lock:
+            self._prune()
+            if self._unfinished() >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already queued")
+            job = Job(uuid.uuid4().hex, **extra)
+            self.jobs[job.job_id] = job
+        return job
+
+    def submit(self, fn, *args, on_success=None, on_done=None, extra=None, **kwargs):
+        """Submit fn(*args, **kwargs) to the pool, fn must return (success, data).
+
+        on_success(data) is called in the server process when the job succeeds,
+        on_done() when the job is finished (also if it failed). Returns the job id.
+        """
+
+        job = self._new_job(**(extra or {}))
+        try:
+            self._submit(job, (fn, args, kwargs), on_success, on_done)
+        except BaseException:
+            with self._lock:
+                self.jobs.pop(job.job_id, None)
+            raise
+        return job.job_id
+
+    def _submit(self, job, call, on_success, on_done):
+        fn, args, kwargs = call
+        job.attempts += 1
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            executor = self.executor
+            future = executor.submit(fn, *args, **kwargs)
+        job.future = future
+        future.add_done_callback(
+            lambda future: self._finish(
+                job, future, on_success, on_done, executor, call
+            )
+        )
+
+    def add_finished(self, data, extra=None):
+        """Register a job that is already done (e.g. a cached result)."""
+
+        job = self._new_job(**(extra or {}))
+        job.success, job.data, job.finished = True, data, time.time()
+        job.done.set()
+        return job.job_id
+
+    def _finish(self, job, future, on_success, on_done, executor, call):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_executor(executor)
+            if job.attempts <= self.retries:
+                logging.debug(f"job {job.job_id} was lost with its worker, retrying")
+                try:
+                    return self._submit(job, call, on_success, on_done)
+                except Exception as err:
+                    logging.debug(f"could not submit job {job.job_id} again: {err!r}")
+        try:
+            job.success, job.data = future.result()
+            if not job.success:
+                job.error = str(job.data)
+                job.data = None
+        except Exception as err:  # the job should never bring down the server
+            logging.debug(f"job {job.job_id} failed: {err!r}")
+            job.success, job.error = False, repr(err)
+        if job.success and on_success is not None:
+            try:
+                on_success(job.data)
+            except Exception as err:
+                logging.debug(f"on_success of job {job.job_id} failed: {err!r}")
+        if on_done is not None:
+            try:
+                on_done()
+            except Exception as err:
+                logging.debug(f"on_done of job {job.job_id} failed: {err!r}")
+        job.finished = time.time()
+        job.done.set()
+
+    def get(self, job_id):
+        """The job with the given id (or None)."""
+
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Wait until the job is finished, returns it (or None if it is unknown)."""
+
+        if (job := self.get(job_id)) is not None:
+            job.done.wait(timeout)
+        return job
+
+    def discard(self, job_id):
+        """Forget a job (e.g. when its result was already used)."""
+
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def status(self, job_id):
+        """Status report of a job (or None if the job is unknown)."""
+
+        if (job := self.get(job_id)) is None:
+            return None
+        report = {
+            "job_id": job_id,
+            "status": job.status,
+            "submitted": job.submitted,
+            "finished": job.finished,
+            **job.extra,
+        }
+        if job.status == "queued":
+            with self._lock:
+                report["queue_position"] = sum(
+                    other.finished is None
+                    and other.submitted < job.submitted
+                    and other.status == "queued"
+                    for other in self.jobs.values()
+                )
+        if job.error:
+            report["error"] = job.error
+        return report
+
+    def shutdown(self):
+        """Stop the process pool."""
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
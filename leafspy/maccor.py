@@ -0,0 +1,481 @@
+"""Native (vectorized) reader for Maccor S4000 txt exports."""
+
+import functools
+import hashlib
+import io
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from . import parallel
+from .staging import is_buffer
+
+# the file formats of the supported models (the cellpy models with the same name
+# are maccor_txt_one, maccor_txt_two and maccor_txt_three)
+MODELS = {
+    "S4000-UBHAM": {
+        "skiprows": 3,
+        "decimal": ".",
+        "encoding": "ISO-8859-1",
+        "remove_empty_lines": False,
+        "state_column": "State",
+        "headers": {
+            "Rec#": "data_point",
+            "Cyc#": "cycle_index",
+            "Step": "step_index",
+            "TestTime": "test_time",
+            "StepTime": "step_time",
+            "Amp-hr": "charge_capacity",
+            "Watt-hr": "power",
+            "Amps": "current",
+            "Volts": "voltage",
+            "DPt Time": "date_time",
+            "ACImp/Ohms": "ac_impedance",
+            "DCIR/Ohms": "internal_resistance",
+        },
+        "remove_last_if_bad": False,
+        "timedelta_columns": ["step_time", "test_time"],
+    },
+    "S4000-KIT": {
+        "skiprows": 12,
+        "decimal": ",",
+        "encoding": "ISO-8859-1",
+        "remove_empty_lines": True,
+        "state_column": "Md",
+        "headers": {
+            "Rec": "data_point",
+            "Cycle C": "cycle_index",
+            "Step": "step_index",
+            "TestTime": "test_time",
+            "StepTime": "step_time",
+            "Cap. [Ah]": "charge_capacity",
+            "Ener. [Wh]": "charge_energy",
+            "Current [A]": "current",
+            "Voltage [V]": "voltage",
+            "DPT Time": "date_time",
+        },
+        "remove_last_if_bad": True,
+        "timedelta_columns": [],
+    },
+    "S4000-WMG": {
+        "skiprows": 2,
+        "decimal": ",",
+        "encoding": "ISO-8859-1",
+        "remove_empty_lines": True,
+        "state_column": "State",
+        "headers": {
+            "Rec#": "data_point",
+            "Cyc#": "cycle_index",
+            "Step": "step_index",
+            "TestTime": "test_time",
+            "StepTime": "step_time",
+            "mAmp-hr": "charge_capacity",
+            "mWatt-hr": "charge_energy",
+            "mAmps": "current",
+            "Volts": "voltage",
+            "DPt Time": "date_time",
+        },
+        "remove_last_if_bad": True,
+        "timedelta_columns": ["step_time", "test_time"],
+    },
+}
+
+# tried in this order for files with date_time values in more than one layout
+DATE_TIME_FORMATS = ["%m/%d/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S"]
+
+# temporary column for the date_time values parsed while reading the file
+PARSED_DATE_TIME = "_parsed_date_time"
+
+CHARGE_KEYS = ["C"]
+DISCHARGE_KEYS = ["D"]
+
+# parsed as float64 (when not converted from timedelta strings)
+FLOAT_COLUMNS = [
+    "test_time",
+    "step_time",
+    "charge_capacity",
+    "charge_energy",
+    "power",
+    "current",
+    "voltage",
+    "ac_impedance",
+    "internal_resistance",
+]
+# downcast to the smallest integer type (like cellpy does)
+INTEGER_COLUMNS = ["data_point", "step_index", "cycle_index"]
+# always read, also when only some of the columns are requested
+REQUIRED_COLUMNS = [
+    "data_point",
+    "cycle_index",
+    "step_index",
+    "test_time",
+    "step_time",
+    "charge_capacity",
+    "current",
+    "voltage",
+    "date_time",
+]
+
+
+def _header_lines(file_name, skiprows, encoding):
+    """Number of physical lines before the header, when skiprows counts non-empty lines only."""
+
+    lines = 0
+    if is_buffer(file_name):
+        f = io.TextIOWrapper(io.BytesIO(file_name), encoding=encoding)
+    else:
+        f = open(file_name, "r", encoding=encoding)
+    with f:
+        for line in f:
+            if skiprows == 0 and line.strip():
+                break
+            lines += 1
+            if line.strip():
+                skiprows -= 1
+    return lines
+
+
+def _convert_values(df, timedelta_columns, date_time_column, date_format):
+    """Convert the values that do not depend on other rows (applied to each part of the file).
+
+    The timedelta strings are converted to seconds, the date_time strings are parsed
+    with date_format into an extra column (see _date_time).
+    """
+
+    for column in timedelta_columns:
+        if column in df.columns:
+            df[column] = pd.to_timedelta(df[column], errors="coerce").dt.total_seconds()
+    if date_format is not None:
+        df[PARSED_DATE_TIME] = pd.to_datetime(
+            df[date_time_column], format=date_format, errors="coerce"
+        )
+    return df
+
+
+def _date_format(file_name, date_time_column, **read_kwargs):
+    """The format of the first date_time value of the file (as guessed by pandas)."""
+
+    first = pd.read_csv(
+        parallel.readable(file_name),
+        header=0,
+        nrows=1,
+        usecols=[date_time_column],
+        **read_kwargs,
+    )[date_time_column]
+    if first.empty or not isinstance(first.iat[0], str):
+        return None
+    return guess_datetime_format(first.iat[0])
+
+
+def _split_by_state(values, states, cycles, keys, sign=1.0, propagate=False):
+    """Values of the rows in one of the states (others are 0) - vectorized.
+
+    If propagate is True, the last value of the state in each cycle is carried on to
+    the following rows of that cycle.
+    """
+
+    values = values.to_numpy(dtype=np.float64)
+    selected = states.isin(keys).to_numpy()
+    out = np.zeros(len(values))
+    out[selected & ~np.isnan(values)] = sign * values[selected & ~np.isnan(values)]
+    if propagate and selected.any():
+        positions = pd.Series(np.where(selected, np.arange(len(values)), -1))
+        last = positions.groupby(cycles.to_numpy(), dropna=False).transform("max").to_numpy()
+        after = (last >= 0) & (np.arange(len(values)) > last)
+        out[after] = values[last[after]]
+    return out
+
+
+def _date_time(values, parsed=None):
+    """The date_time column, using the values parsed with the guessed format if they all fit."""
+
+    if parsed is not None and not (parsed.isna() & values.notna()).any():
+        # the same as pd.to_datetime does with the format it infers
+        return pd.Series(parsed.to_numpy(), index=values.index)
+    return _to_datetime(values)
+
+
+def _to_datetime(values):
+    """Convert to datetime like cellpy does (with format="mixed" if one format does not fit).
+
+    Parsing with format="mixed" is done value by value (with dateutil), the usual layouts
+    (month first if possible, day first otherwise - as dateutil does) are parsed
+    vectorized first.
+    """
+
+    try:
+        return pd.to_datetime(values)
+    except ValueError:
+        logging.debug("could not convert date_time with one format, using mixed format")
+
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for date_format in [*DATE_TIME_FORMATS, "mixed"]:
+        missing = parsed.isna() & values.notna()
+        if not missing.any():
+            break
+        errors = "raise" if date_format == "mixed" else "coerce"
+        parsed[missing] = pd.to_datetime(
+            values[missing], format=date_format, errors=errors
+        )
+    return parsed
+
+
+def _source_size(file_name):
+    return len(file_name) if is_buffer(file_name) else os.path.getsize(file_name)
+
+
+def _prefix_digest(file_name, size, chunk_size=1024 * 1024):
+    """The sha256 digest of the first size bytes of the file (or its content)."""
+
+    digest = hashlib.sha256()
+    if is_buffer(file_name):
+        digest.update(memoryview(file_name)[:size])
+        return digest.hexdigest()
+    with open(file_name, "rb") as f:
+        while size > 0 and (data := f.read(min(chunk_size, size))):
+            digest.update(data)
+            size -= len(data)
+    return digest.hexdigest()
+
+
+def _complete_lines_offset(file_name, tail=64 * 1024):
+    """Byte offset of the end of the last complete line (None if it is not in the tail).
+
+    The last line of a file that is still written might be incomplete (no line break).
+    """
+
+    size = _source_size(file_name)
+    start = max(0, size - tail)
+    data = parallel.read_range(file_name, start, size)
+    line = data.rfind(b"\n") + 1
+    if line == 0 and start > 0:
+        return None
+    return start + line
+
+
+def _read_lines(file_name, offset, names, transform, read_kwargs):
+    """Parse the data lines from the byte offset to the end (None if there are none)."""
+
+    data = parallel.read_range(file_name, offset, _source_size(file_name))
+    if callable(usecols := read_kwargs.get("usecols")):
+        read_kwargs = {**read_kwargs, "usecols": [n for n in names if usecols(n)]}
+    try:
+        df = pd.read_csv(io.BytesIO(data), header=None, names=names, **read_kwargs)
+    except pd.errors.EmptyDataError:
+        return None
+    return transform(df)
+
+
+def _resume(file_name, resume, transform, read_kwargs):
+    """The rows parsed for the checkpoint resume and the ones appended to the file since.
+
+    Returns None if the file was changed before the end of the checkpoint, or the
+    appended rows are parsed with other dtypes (i.e. the file has to be read completely).
+    """
+
+    offset = resume["offset"]
+    if (
+        _source_size(file_name) <= offset
+        or _prefix_digest(file_name, offset) != resume["digest"]
+    ):
+        logging.debug("the file changed before the checkpoint, reading all rows")
+        return None
+    appended = _read_lines(file_name, offset, resume["names"], transform, read_kwargs)
+    parsed = resume["parsed"]
+    if appended is None or not appended.dtypes.equals(parsed.dtypes):
+        logging.debug("the appended rows do not fit the checkpoint, reading all rows")
+        return None
+    logging.debug(f"resuming after {len(parsed)} rows, {len(appended)} rows appended")
+    return pd.concat([parsed, appended], ignore_index=True)
+
+
+def _store_checkpoint(
+    checkpoint, file_name, parsed, data_offset, transform, read_kwargs
+):
+    """Store the rows parsed from the complete lines of the file."""
+
+    offset = _complete_lines_offset(file_name)
+    if offset is None or offset < data_offset:
+        return
+    last = _read_lines(file_name, offset, checkpoint["names"], transform, read_kwargs)
+    rows = len(parsed) - (0 if last is None else len(last))
+    checkpoint.update(
+        data_offset=data_offset,
+        offset=offset,
+        digest=_prefix_digest(file_name, offset),
+        parsed=parsed.iloc[:rows],
+    )
+
+
+def _finish(parsed, spec):
+    """The raw frame from the parsed rows: the columns that depend on other rows.
+
+    parsed is not changed (it can be part of a checkpoint).
+    """
+
+    raw = parsed.rename(columns=spec["headers"])
+    parsed_date_time = raw.pop(PARSED_DATE_TIME) if PARSED_DATE_TIME in raw else None
+
+    if spec["remove_last_if_bad"] and len(raw) > 1:
+        if raw.iloc[-1].isna().sum() > raw.iloc[-2].isna().sum():
+            raw = raw.iloc[:-1]
+            if parsed_date_time is not None:
+                parsed_date_time = parsed_date_time.iloc[:-1]
+
+    states = raw[spec["state_column"]]
+    cycles = raw["cycle_index"]
+    capacity = pd.to_numeric(raw["charge_capacity"], errors="coerce")
+    raw["charge_capacity"] = _split_by_state(
+        capacity, states, cycles, CHARGE_KEYS, propagate=True
+    )
+    raw["discharge_capacity"] = _split_by_state(
+        capacity, states, cycles, DISCHARGE_KEYS, propagate=True
+    )
+    current = pd.to_numeric(raw["current"], errors="coerce")
+    raw["current"] = _split_by_state(
+        current, states, cycles, CHARGE_KEYS
+    ) + _split_by_state(current, states, cycles, DISCHARGE_KEYS, sign=-1.0)
+
+    raw = raw.set_index("data_point", drop=False)
+    if raw["cycle_index"].min() == 0:
+        raw["cycle_index"] += 1
+    raw["date_time"] = _date_time(raw["date_time"], parsed_date_time)
+
+    for column in INTEGER_COLUMNS:
+        raw[column] = pd.to_numeric(raw[column], errors="coerce", downcast="integer")
+    return raw
+
+
+def read_maccor_txt(
+    file_name,
+    model,
+    columns=None,
+    workers=1,
+    resume=None,
+    checkpoint=None,
+    encoding=None,
+):
+    """Read a Maccor txt export into a frame with cellpy column names.
+
+    The frame is the same as the raw data created by cellpy (instrument maccor_txt)
+    for the model: data_point index, cycles starting at 1, capacity and current split
+    by the state column, date_time as datetime and the times in seconds. If columns
+    (cellpy names) are given, only these and the columns needed for the step table and
+    summary are read. With more than one worker, large files are tokenized in parallel
+    (see parallel.read_csv), the columns depending on other rows are computed afterwards.
+    file_name can also be the content of the file (bytes), encoding overrides the one
+    of the model (e.g. for a file that was transcoded to UTF-8).
+
+    For files that are still growing, the parsed rows are stored in the checkpoint (a
+    dict) if one is given. With resume, the checkpoint of an earlier version of the
+    file, only the lines appended since are parsed (if the file was not changed
+    otherwise). checkpoint["resumed_rows"] is the number of rows taken from resume.
+    """
+
+    spec = MODELS[model]
+    encoding = encoding or spec["encoding"]
+    headers = spec["headers"]
+    renamed = {cellpy_name: raw for raw, cellpy_name in headers.items()}
+
+    usecols = None
+    if columns is not None:
+        wanted = {renamed.get(c, c) for c in [*REQUIRED_COLUMNS, *columns]}
+        wanted.add(spec["state_column"])
+        usecols = lambda c: c in wanted  # noqa: E731
+
+    dtype = {
+        renamed[c]: np.float64
+        for c in FLOAT_COLUMNS
+        if c in renamed and c not in spec["timedelta_columns"]
+    }
+    dtype[spec["state_column"]] = object
+
+    header_kwargs = dict(
+        sep="\t",
+        encoding=encoding,
+        # cellpy strips the lines of these models, i.e. ignores trailing separators
+        index_col=False if spec["remove_empty_lines"] else None,
+    )
+    read_kwargs = dict(
+        decimal=spec["decimal"],
+        usecols=usecols,
+        dtype=dtype,
+        engine="c",
+        **header_kwargs,
+    )
+    date_time_column = renamed["date_time"]
+    transform = functools.partial(
+        _convert_values,
+        timedelta_columns=[renamed[c] for c in spec["timedelta_columns"]],
+        date_time_column=date_time_column,
+    )
+
+    parsed = None
+    if (
+        resume
+        and resume.get("model") == model
+        and resume.get("columns") == columns
+        and resume.get("encoding", spec["encoding"]) == encoding
+    ):
+        parsed = _resume(
+            file_name,
+            resume,
+            functools.partial(transform, date_format=resume["date_format"]),
+            read_kwargs,
+        )
+    if parsed is not None:
+        skiprows, names = None, resume["names"]
+        data_offset, date_format = resume["data_offset"], resume["date_format"]
+        resumed_rows = len(resume["parsed"])
+    else:
+        skiprows = spec["skiprows"]
+        if spec["remove_empty_lines"]:
+            skiprows = _header_lines(file_name, skiprows, encoding)
+        date_format = _date_format(
+            file_name, date_time_column, skiprows=skiprows, **header_kwargs
+        )
+        parsed = parallel.read_csv(
+            file_name,
+            workers=workers,
+            skiprows=skiprows,
+            transform=functools.partial(transform, date_format=date_format),
+            **read_kwargs,
+        )
+        resumed_rows = 0
+
+    if checkpoint is not None:
+        if skiprows is not None:
+            names = list(
+                pd.read_csv(
+                    parallel.readable(file_name),
+                    skiprows=skiprows,
+                    header=0,
+                    nrows=0,
+                    **header_kwargs,
+                ).columns
+            )
+            data_offset = parallel.data_offset(file_name, skiprows + 1)
+        checkpoint.update(
+            model=model,
+            columns=columns,
+            encoding=encoding,
+            names=names,
+            date_format=date_format,
+            resumed_rows=resumed_rows,
+        )
+        _store_checkpoint(
+            checkpoint,
+            file_name,
+            parsed,
+            data_offset,
+            functools.partial(transform, date_format=date_format),
+            read_kwargs,
+        )
+
+    raw = _finish(parsed, spec)
+    source = "memory" if is_buffer(file_name) else file_name
+    logging.debug(f"read {len(raw)} rows from {source} ({model})")
+    return raw
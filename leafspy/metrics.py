@@ -0,0 +1,194 @@
+"""In-process metrics, exposed in the Prometheus text format.
+
+The values are kept per process (with several server processes, each one has to be
+scraped).
+"""
+
+import math
+import threading
+
+# upper bounds (seconds) of the histogram buckets
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        unknown = set(labels) - set(self.label_names)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, key, (), value
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            for name, key, extra, value in self._samples():
+                labels = _format_labels(self.label_names, key, extra)
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def value(self, **labels):
+        """The number of observations and their sum."""
+
+        with self._lock:
+            counts, total = self._values.get(self._key(labels), ([0], 0.0))
+            return counts[-1], total
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = _format_value(float(bound))
+                yield f"{self.name}_bucket", key, [("le", le)], count
+            yield f"{self.name}_sum", key, (), total
+            yield f"{self.name}_count", key, (), counts[-1]
+
+
+class Registry:
+    """A collection of metrics that are exposed together."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def expose(self):
+        """All metrics in the Prometheus text exposition format."""
+
+        return "\n".join(metric.expose() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LABELS = ["stage", "instrument", "test_type", "converter"]
+STAGE_SECONDS = REGISTRY.histogram(
+    "leafs_stage_seconds",
+    "Time spent in each stage of an upload (sniff, decompress, spool_write, convert, "
+    "serialize, response).",
+    STAGE_LABELS,
+)
+BYTES = REGISTRY.counter(
+    "leafs_bytes_total",
+    "Bytes received (compressed and decompressed) and sent in conversion responses "
+    "(out before and out_<encoding> after the response compression).",
+    ["direction", "instrument", "test_type"],
+)
+ROWS = REGISTRY.counter(
+    "leafs_rows_converted_total",
+    "Rows of experiment data converted (not counting cached results).",
+    ["instrument", "test_type", "converter"],
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "leafs_requests_in_flight",
+    "Requests that are being handled (until the response is sent).",
+    ["endpoint"],
+)
+REQUESTS = REGISTRY.counter(
+    "leafs_requests_total", "Handled requests.", ["endpoint", "status"]
+)
@@ -0,0 +1,141 @@
+"""Parsing (large) delimited text files with several processes."""
+
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .staging import is_buffer
+
+# files smaller than this are parsed in the calling process
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+
+
+def readable(source):
+    """The path of a file as it is, the content of a file (bytes) as a binary file object."""
+
+    return io.BytesIO(source) if is_buffer(source) else source
+
+
+def _open(source):
+    return io.BytesIO(source) if is_buffer(source) else open(source, "rb")
+
+
+def data_offset(file_name, lines):
+    """Byte offset of the line after the first lines of the file (or its content)."""
+
+    with _open(file_name) as f:
+        for _ in range(lines):
+            if not f.readline():
+                break
+        return f.tell()
+
+
+def line_ranges(file_name, start, parts):
+    """Split the file from start to the end in (about) equal byte ranges at line boundaries."""
+
+    size = os.path.getsize(file_name)
+    bounds = [start]
+    with open(file_name, "rb") as f:
+        for part in range(1, parts):
+            f.seek(start + (size - start) * part // parts)
+            f.readline()  # move on to the start of the next line
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def read_range(file_name, start, end):
+    """The bytes of the file (or its content) between the offsets start and end."""
+
+    if is_buffer(file_name):
+        return bytes(file_name[start:end])
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def map_ranges(file_name, function, workers, start=0, args=()):
+    """Call function(file_name, range_start, range_end, *args) for line ranges of the file.
+
+    The file (from start) is split into workers ranges, the function (picklable) is
+    called in worker processes. Returns the results in the order of the ranges.
+    """
+
+    ranges = line_ranges(file_name, start, workers)
+    logging.debug(f"processing {file_name} in {len(ranges)} parts")
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(function, file_name, range_start, range_end, *args)
+            for range_start, range_end in ranges
+        ]
+        return [future.result() for future in futures]
+
+
+def _read_range(file_name, start, end, names, transform, read_kwargs):
+    """Parse the lines between the byte offsets start and end (runs in a worker)."""
+
+    data = read_range(file_name, start, end)
+    try:
+        df = pd.read_csv(io.BytesIO(data), header=None, names=names, **read_kwargs)
+    except pd.errors.EmptyDataError:
+        return None
+    if transform is not None:
+        df = transform(df)
+    return df
+
+
+def read_csv(file_name, workers=1, skiprows=0, transform=None, **read_kwargs):
+    """pd.read_csv for a file with one header line (after skiprows lines), optionally in parallel.
+
+    With more than one worker (and a file of at least PARALLEL_MIN_SIZE bytes), the
+    data lines are split into byte ranges that are parsed in worker processes, the
+    parts are concatenated in order (with a new row index). transform (a picklable
+    function) is applied to each part, it must not depend on the other rows. A
+    callable usecols is resolved with the header before it is sent to the workers.
+    The content of a file (bytes) is always parsed in the calling process.
+    """
+
+    if (
+        is_buffer(file_name)
+        or workers <= 1
+        or os.path.getsize(file_name) < PARALLEL_MIN_SIZE
+    ):
+        df = pd.read_csv(
+            readable(file_name), skiprows=skiprows, header=0, **read_kwargs
+        )
+        return df if transform is None else transform(df)
+
+    header_kwargs = {
+        key: value
+        for key, value in read_kwargs.items()
+        if key in ["sep", "encoding", "index_col"]
+    }
+    names = list(
+        pd.read_csv(
+            file_name, skiprows=skiprows, header=0, nrows=0, **header_kwargs
+        ).columns
+    )
+    if callable(usecols := read_kwargs.get("usecols")):
+        read_kwargs["usecols"] = [name for name in names if usecols(name)]
+
+    parts = map_ranges(
+        file_name,
+        _read_range,
+        workers,
+        start=data_offset(file_name, skiprows + 1),
+        args=(names, transform, read_kwargs),
+    )
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return pd.DataFrame(columns=read_kwargs.get("usecols") or names)
+    return pd.concat(parts, ignore_index=True)
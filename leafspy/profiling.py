@@ -0,0 +1,82 @@
+"""Opt-in profiling of single requests (stage timings, memory peak and cProfile)."""
+
+import contextlib
+import cProfile
+import logging
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+# tracemalloc traces the whole process, traced conversions run one at a time
+_tracing_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def trace_memory(result):
+    """Trace the memory allocations of the with block.
+
+    The peak (in bytes) of the allocations is stored in result["peak"].
+    """
+
+    with _tracing_lock:
+        tracemalloc.start()
+        try:
+            yield result
+        finally:
+            result["peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+class RequestProfile:
+    """The stage timings (and optionally a cProfile run) of one request.
+
+    With a profile_folder, the request is profiled with cProfile and the statistics
+    are written to a .prof file in the folder (see stop).
+    """
+
+    def __init__(self, profile_folder=None):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.memory_peak = None
+        self.profile_folder = profile_folder
+        self.profiler = None
+        if profile_folder:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as err:
+                # only one profiler can be active at the same time
+                logging.debug(f"could not start the profiler: {err}")
+            else:
+                self.profiler = profiler
+
+    def record(self, stage, seconds):
+        """Add the duration of a stage (stages of several files are summed)."""
+
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """The stage timings (and the total) as Server-Timing header value."""
+
+        total = time.perf_counter() - self.started
+        return ", ".join(
+            f"{stage};dur={seconds * 1000:.3f}"
+            for stage, seconds in [*self.stages.items(), ("total", total)]
+        )
+
+    def stop(self, name="request"):
+        """Stop the profiler and write its statistics, returns the file (or None)."""
+
+        if self.profiler is None:
+            return None
+        self.profiler.disable()
+        folder = Path(self.profile_folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = folder / f"{stamp}-{name}-{uuid.uuid4().hex[:8]}.prof"
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        logging.debug(f"wrote profile of {name} to {path}")
+        return path
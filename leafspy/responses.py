@@ -0,0 +1,214 @@
+"""Serialization of conversion results into HTTP responses."""
+
+import io
+import json
+import tempfile
+import zipfile
+
+from flask import Response
+
+DEFAULT_CHUNK_ROWS = 10_000
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+# response format -> mime type used for content negotiation
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+    "npz": "application/x-npz",
+}
+
+
+def iter_json(obj, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Encode obj as JSON piece by piece.
+
+    DataFrames are written in the same layout as ``df.to_json(orient="split")``, but
+    ``chunk_rows`` rows at a time, so the full encoded frame is never held in memory.
+    Dictionary keys starting with an underscore are internal and not written.
+    """
+    import pandas as pd
+
+    if isinstance(obj, pd.DataFrame):
+        yield from _iter_frame(obj, chunk_rows)
+    elif isinstance(obj, dict):
+        yield "{"
+        items = [(k, v) for k, v in obj.items() if not str(k).startswith("_")]
+        for i, (key, value) in enumerate(items):
+            yield ("," if i else "") + json.dumps(str(key)) + ":"
+            yield from iter_json(value, chunk_rows)
+        yield "}"
+    elif isinstance(obj, (list, tuple)):
+        yield "["
+        for i, value in enumerate(obj):
+            if i:
+                yield ","
+            yield from iter_json(value, chunk_rows)
+        yield "]"
+    else:
+        yield json.dumps(obj)
+
+
+def _iter_frame(df, chunk_rows):
+    import numpy as np
+
+    from .compact import float32_as_decimal
+
+    n_rows = len(df)
+    yield '{"columns":' + df.columns.to_series(index=None).to_json(orient="values")
+    yield ',"index":['
+    for start in range(0, n_rows, chunk_rows):
+        index = df.index[start : start + chunk_rows].to_series(index=None)
+        yield ("," if start else "") + index.to_json(orient="values")[1:-1]
+    yield '],"data":['
+    float32_columns = [
+        i for i, dtype in enumerate(df.dtypes) if dtype == np.float32
+    ]
+    for start in range(0, n_rows, chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        if float32_columns:
+            chunk = chunk.copy()
+            for i in float32_columns:
+                chunk.isetitem(i, float32_as_decimal(chunk.iloc[:, i].to_numpy()))
+        rows = chunk.to_json(orient="values")
+        yield ("," if start else "") + rows[1:-1]
+    yield "]}"
+
+
+def json_response(data, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Chunked JSON response for a conversion result."""
+
+    return Response(iter_json(data, chunk_rows), mimetype="application/json")
+
+
+def negotiate_format(requested=None, accept_mimetypes=None):
+    """Pick the response format from an explicit request or the Accept header.
+
+    Returns None if an explicitly requested format is not known.
+    """
+
+    if requested:
+        requested = requested.lower()
+        return requested if requested in RESPONSE_FORMATS else None
+    if accept_mimetypes:
+        best = accept_mimetypes.best_match(
+            list(RESPONSE_FORMATS.values()), default=RESPONSE_FORMATS["json"]
+        )
+        for name, mimetype in RESPONSE_FORMATS.items():
+            if mimetype == best:
+                return name
+    return "json"
+
+
+def _split_result(data):
+    """Separate the data frames of a conversion result from the metadata blocks."""
+    import pandas as pd
+
+    data = {k: v for k, v in data.items() if not str(k).startswith("_")}
+    frames = {k: v for k, v in data.items() if isinstance(v, pd.DataFrame)}
+    metadata = {k: v for k, v in data.items() if not isinstance(v, pd.DataFrame)}
+    return frames, metadata
+
+
+def _exportable(df):
+    # pyarrow refuses an index that has the same name as a column
+    # (the summary has cycle_index both as index and as column).
+    if df.index.name is not None and df.index.name in df.columns:
+        df = df.rename_axis(None)
+    return df
+
+
+def _write_arrow(df, f_out, metadata):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(_exportable(df), preserve_index=True)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"leafs": json.dumps(metadata).encode()}
+    )
+    with pa.ipc.new_file(f_out, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _write_parquet(df, f_out, metadata):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(_exportable(df), preserve_index=True)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"leafs": json.dumps(metadata).encode()}
+    )
+    pq.write_table(table, f_out)
+
+
+_TABLE_WRITERS = {
+    "arrow": _write_arrow,
+    "parquet": _write_parquet,
+}
+
+
+def write_bundle(data, fmt, f_out):
+    """Write a conversion result as a zip bundle of binary tables.
+
+    The bundle contains ``metadata.json`` (everything that is not a data frame) and one
+    ``<key>.<fmt>`` member per data frame. Members are stored uncompressed, so a client
+    can memory-map the bundle and open the tables without copying.
+    """
+
+    frames, metadata = _split_result(data)
+    with zipfile.ZipFile(f_out, "w", compression=zipfile.ZIP_STORED) as bundle:
+        bundle.writestr("metadata.json", json.dumps(metadata))
+        for key, df in frames.items():
+            buffer = io.BytesIO()
+            _TABLE_WRITERS[fmt](df, buffer, metadata)
+            bundle.writestr(f"{key}.{fmt}", buffer.getvalue())
+
+
+def write_npz(data, f_out):
+    """Write a conversion result as an (uncompressed) numpy npz archive.
+
+    Each column is stored as ``<key>/<column>`` (and the index as ``<key>/__index__``),
+    the metadata blocks are stored as a json string under ``metadata``.
+    """
+    import numpy as np
+
+    frames, metadata = _split_result(data)
+    arrays = {"metadata": np.array(json.dumps(metadata))}
+    for key, df in frames.items():
+        arrays[f"{key}/__index__"] = df.index.to_numpy()
+        for column in df.columns:
+            values = df[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"{key}/{column}"] = values
+    np.savez(f_out, **arrays)
+
+
+def _iter_file(f, block_size=STREAM_BLOCK_SIZE):
+    try:
+        f.seek(0)
+        while block := f.read(block_size):
+            yield block
+    finally:
+        f.close()
+
+
+def binary_response(data, fmt):
+    """Response with the conversion result encoded in one of the binary formats."""
+
+    f_out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    if fmt == "npz":
+        write_npz(data, f_out)
+        mimetype = RESPONSE_FORMATS["npz"]
+        filename = "experiment.npz"
+    else:
+        write_bundle(data, fmt, f_out)
+        mimetype = "application/zip"
+        filename = f"experiment.{fmt}.zip"
+    return Response(
+        _iter_file(f_out),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Leafs-Format": fmt,
+        },
+    )
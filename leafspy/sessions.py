@@ -0,0 +1,210 @@
+"""Resumable uploads: the (compressed) file is sent in chunks over several requests."""
+
+import base64
+import binascii
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+# Content-Digest algorithms (RFC 9530) accepted for the chunks
+DIGEST_ALGORITHMS = {"sha-256": hashlib.sha256, "sha-512": hashlib.sha512}
+
+
+class ChunkRejected(Exception):
+    """A chunk of a resumable upload can not be accepted (the offset is unchanged)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_digest(header):
+    """The algorithm and the digest of a Content-Digest header, e.g. sha-256=:<base64>:
+
+    Raises ValueError if the header has no (valid) digest of a supported algorithm.
+    """
+
+    for member in (header or "").split(","):
+        algorithm, _, value = member.strip().partition("=")
+        algorithm = algorithm.strip().lower()
+        if algorithm not in DIGEST_ALGORITHMS:
+            continue
+        value = value.strip()
+        if len(value) < 2 or value[0] != ":" or value[-1] != ":":
+            raise ValueError(f"Invalid {algorithm} digest")
+        try:
+            return algorithm, base64.b64decode(value[1:-1], validate=True)
+        except binascii.Error:
+            raise ValueError(f"Invalid {algorithm} digest")
+    raise ValueError(
+        f"A Content-Digest with one of {list(DIGEST_ALGORITHMS)} is required"
+    )
+
+
+class UploadSession:
+    """A resumable upload, the chunks are appended to a staged file (see write_chunk)."""
+
+    def __init__(self, session_id, staged, filename, size=None, **fields):
+        self.session_id = session_id
+        self.staged = staged
+        self.filename = filename
+        self.size = size
+        self.fields = fields
+        self.created = self.updated = time.time()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def offset(self):
+        """The number of bytes received."""
+
+        return self.staged.size
+
+    @property
+    def complete(self):
+        return self.size is None or self.offset == self.size
+
+    def status(self, ttl):
+        return {
+            "session_id": self.session_id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "size": self.size,
+            "expires": self.updated + ttl,
+        }
+
+    def write_chunk(
+        self, stream, start, length, algorithm, digest, chunk_size, total=None
+    ):
+        """Append the length bytes read from stream, they have to start at the offset.
+
+        The data is written while it is read (in chunk_size parts), it is truncated
+        again if the digest (of algorithm) does not match or the stream ends early.
+        total is the size of the file (if the client knows it). Returns the new
+        offset, raises ChunkRejected.
+        """
+
+        if not self._lock.acquire(blocking=False):
+            raise ChunkRejected("Another chunk of the upload is being written", 409)
+        try:
+            if self.closed:
+                raise ChunkRejected("Unknown upload session", 404)
+            if start != self.offset:
+                raise ChunkRejected(f"Expected a chunk at offset {self.offset}", 409)
+            if total is not None and self.size is not None and total != self.size:
+                raise ChunkRejected(f"The size of the file is {self.size} bytes")
+            if self.size is None:
+                self.size = total
+            if self.size is not None and start + length > self.size:
+                raise ChunkRejected(
+                    f"The chunk ends after the end of the file ({self.size} bytes)"
+                )
+
+            checksum = DIGEST_ALGORITHMS[algorithm]()
+            written = 0
+            try:
+                while written < length:
+                    data = stream.read(min(chunk_size, length - written))
+                    if not data:
+                        break
+                    checksum.update(data)
+                    self.staged.write(data)
+                    written += len(data)
+                if written != length:
+                    raise ChunkRejected(
+                        f"Incomplete chunk ({written} of {length} bytes)"
+                    )
+                if checksum.digest() != digest:
+                    raise ChunkRejected(
+                        f"The {algorithm} digest of the chunk does not match"
+                    )
+            except BaseException:
+                self.staged.truncate(start)
+                raise
+            finally:
+                self.staged.close()
+            self.updated = time.time()
+            logging.debug(f"upload session {self.session_id}: {written} bytes at {start}")
+            return self.offset
+        finally:
+            self._lock.release()
+
+
+class UploadSessions:
+    """The resumable uploads, staged in staging.
+
+    Sessions without a new chunk for ttl seconds are removed (with their data).
+    """
+
+    def __init__(self, staging, ttl=24 * 3600):
+        self.staging = staging
+        self.ttl = ttl
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        limit = time.time() - self.ttl
+        for session_id in [
+            session_id
+            for session_id, session in self.sessions.items()
+            if session.updated < limit
+        ]:
+            logging.debug(f"upload session {session_id} expired")
+            self._remove(session_id)
+
+    def _remove(self, session_id):
+        session = self.sessions.pop(session_id)
+        session.closed = True
+        session.staged.release()
+        return session
+
+    def create(self, filename, size=None, **fields):
+        """Start a new session for the (compressed) file, returns the session."""
+
+        with self._lock:
+            self._prune()
+        session = UploadSession(
+            uuid.uuid4().hex,
+            self.staging.stage(on_disk=True),
+            filename,
+            size,
+            **fields,
+        )
+        with self._lock:
+            self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        """The session with the given id (or None)."""
+
+        with self._lock:
+            self._prune()
+            return self.sessions.get(session_id)
+
+    def take(self, session_id):
+        """Remove a session to finish it, returns it with its staged upload (or None).
+
+        The staged upload has to be released by the caller. Raises ChunkRejected while
+        a chunk is written.
+        """
+
+        with self._lock:
+            if (session := self.sessions.get(session_id)) is None:
+                return None
+            if not session._lock.acquire(blocking=False):
+                raise ChunkRejected("A chunk of the upload is being written", 409)
+            del self.sessions[session_id]
+            session.closed = True
+            session._lock.release()
+        return session
+
+    def remove(self, session_id):
+        """Abort a session, returns False if it is unknown."""
+
+        if (session := self.take(session_id)) is None:
+            return False
+        session.staged.release()
+        return True
@@ -0,0 +1,127 @@
+"""Identify the format of an upload from its first kilobytes."""
+
+import logging
+import re
+
+from .supported_experiments import (
+    accepted_combinations,
+    accepted_files,
+    accepted_instruments,
+    accepted_tests,
+)
+
+# number of decompressed bytes the sniffer looks at
+SNIFF_SIZE = 4096
+
+MPR_MAGIC = b"BIO-LOGIC MODULAR FILE\x1a"
+# Access (Jet/ACE) databases have the engine name at offset 4
+ACCESS_DB_MAGICS = [b"Standard Jet DB", b"Standard ACE DB"]
+# HDF5 files start with the signature at offset 0 (or after a user block of 512 bytes,
+# 1024 bytes, ... - only the offsets within the sniffed bytes are checked)
+HDF5_MAGIC = b"\x89HDF\r\n\x1a\n"
+
+# header names of the Maccor txt exports that identify the model
+MACCOR_HEADERS = {
+    "MACCOR-S4000-UBHAM": ["Rec#", "Cyc#", "Amp-hr", "Amps"],
+    "MACCOR-S4000-WMG": ["Rec#", "Cyc#", "mAmp-hr", "mAmps"],
+    "MACCOR-S4000-KIT": ["Rec", "Cycle C", "Cap. [Ah]", "Current [A]"],
+}
+# the generic MACCOR-S4000 instrument is read as the S4000-WMG model
+MACCOR_ALIASES = {"MACCOR-S4000-WMG": ["MACCOR-S4000"]}
+
+NUMBER = re.compile(rb"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+# at least this many two-column numeric lines identify an XRD file
+XRD_MIN_LINES = 5
+
+
+class Sniffed:
+    """The format of an upload identified by the sniffer."""
+
+    def __init__(self, description, file_type, instruments=None, test_types=None):
+        self.description = description
+        self.file_type = file_type
+        self.instruments = instruments
+        self.test_types = test_types
+
+    def suggestions(self):
+        """The accepted (extension, test_type, instrument) combinations for the format."""
+
+        file_index = accepted_files.index(self.file_type)
+        suggestions = []
+        for test_index, instruments in accepted_combinations.get(file_index, {}).items():
+            test_type = accepted_tests[test_index]
+            if self.test_types is not None and test_type not in self.test_types:
+                continue
+            for instrument_index in instruments:
+                instrument = accepted_instruments[instrument_index]
+                if self.instruments is None or instrument in self.instruments:
+                    suggestions.append(
+                        {
+                            "extension": self.file_type,
+                            "test_type": test_type,
+                            "instrument": instrument,
+                        }
+                    )
+        return suggestions
+
+    def accepts(self, extension, test_type, instrument):
+        return {
+            "extension": extension,
+            "test_type": test_type,
+            "instrument": instrument,
+        } in self.suggestions()
+
+
+def _maccor_instrument(lines):
+    for line in lines:
+        names = [name.strip() for name in line.split(b"\t")]
+        for instrument, headers in MACCOR_HEADERS.items():
+            if all(header.encode() in names for header in headers):
+                return instrument
+    return None
+
+
+def _is_xrd(lines):
+    """At least XRD_MIN_LINES lines, all data lines with two numbers."""
+
+    data_lines = 0
+    for line in lines:
+        values = line.split()
+        if not values:
+            continue
+        if all(NUMBER.fullmatch(value) for value in values):
+            if len(values) != 2:
+                return False
+            data_lines += 1
+        elif data_lines:
+            # a header after data lines starts a new scan, other text is not XRD
+            if any(NUMBER.fullmatch(value) for value in values):
+                return False
+    return data_lines >= XRD_MIN_LINES
+
+
+def sniff(head):
+    """Identify the format of a file from its first bytes (returns None if unknown)."""
+
+    if head.startswith(MPR_MAGIC):
+        return Sniffed("BioLogic .mpr file", "MPR")
+    if head[4:19] in ACCESS_DB_MAGICS:
+        return Sniffed("Arbin .res file (Access database)", "RES")
+    if any(
+        head[offset : offset + len(HDF5_MAGIC)] == HDF5_MAGIC
+        for offset in [0, *range(512, len(head), 512)]
+    ):
+        return Sniffed("cellpy (HDF5) file", "H5")
+
+    # the last line can be cut off
+    lines = head.splitlines()[:-1] if len(head) >= SNIFF_SIZE else head.splitlines()
+    if instrument := _maccor_instrument(lines):
+        return Sniffed(
+            f"{instrument} txt file",
+            "TXT",
+            instruments=[instrument, *MACCOR_ALIASES.get(instrument, [])],
+        )
+    if _is_xrd(lines):
+        return Sniffed("two-column XRD text file", "TXT", test_types=["XRD"])
+    logging.debug("could not identify the format of the upload")
+    return None
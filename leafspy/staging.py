@@ -0,0 +1,234 @@
+"""Staging of decompressed uploads: in memory, or in files within a disk quota."""
+
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# staged files are named <STAGED_PREFIX><random><suffix>, the janitor only removes these
+STAGED_PREFIX = "staged-"
+
+
+def is_buffer(source):
+    """Check if a converter source is the content of the file (bytes) or its path."""
+
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+class StagingQuotaExceeded(Exception):
+    """Staging the upload would exceed the disk quota."""
+
+
+class Staging:
+    """The staging area of the decompressed uploads.
+
+    Uploads of up to max_memory bytes are kept in memory, larger ones are written to a
+    file in folder (which can be on a tmpfs) as long as all staged files together stay
+    within disk_quota bytes. The janitor removes the files that are not staged anymore
+    (e.g. left behind by a crashed server) once they are older than max_age seconds.
+    """
+
+    def __init__(self, folder, max_memory=16 * 1024**2, disk_quota=None, max_age=3600):
+        self.folder = Path(folder)
+        self.max_memory = max_memory
+        self.disk_quota = disk_quota
+        self.max_age = max_age
+        self.disk_usage = 0
+        self._staged = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._janitor = None
+
+    def stage(self, suffix="", on_disk=False):
+        """A new (empty) staged upload, see StagedUpload."""
+
+        return StagedUpload(self, suffix, on_disk)
+
+    def _create_file(self, suffix):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix=STAGED_PREFIX, dir=self.folder)
+        with self._lock:
+            self._staged.add(path)
+        return os.fdopen(fd, "wb"), Path(path)
+
+    def _remove_file(self, path, size):
+        try:
+            os.remove(path)
+        except OSError as err:
+            logging.debug(f"could not remove staged file {path}: {err}")
+        with self._lock:
+            self._staged.discard(str(path))
+            self.disk_usage -= size
+
+    def _reserve(self, size):
+        with self._lock:
+            if self.disk_quota and self.disk_usage + size > self.disk_quota:
+                raise StagingQuotaExceeded(
+                    f"The staging area is full ({self.disk_quota} bytes), "
+                    "please try again later"
+                )
+            self.disk_usage += size
+
+    def sweep(self):
+        """Remove the old files that are not staged, returns the number of files removed."""
+
+        limit = time.time() - self.max_age
+        removed = 0
+        for path in self.folder.glob(f"{STAGED_PREFIX}*"):
+            with self._lock:
+                if str(path) in self._staged:
+                    continue
+            try:
+                if path.stat().st_mtime < limit:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logging.debug(f"removed {removed} abandoned staged files from {self.folder}")
+        return removed
+
+    def start_janitor(self, interval=300):
+        """Sweep the folder every interval seconds in a background thread."""
+
+        def run():
+            while not self._stopped.wait(interval):
+                self.sweep()
+
+        if self._janitor is None:
+            self.sweep()
+            self._janitor = threading.Thread(target=run, name="janitor", daemon=True)
+            self._janitor.start()
+
+    def stop_janitor(self):
+        self._stopped.set()
+        if self._janitor is not None:
+            self._janitor.join()
+            self._janitor = None
+        self._stopped.clear()
+
+
+class StagedUpload:
+    """A decompressed upload, in memory until it is larger than max_memory of the staging.
+
+    The upload is written with write (and finished with close), source gives the
+    bytes or the path of the file for the converters. It is removed when all owners
+    released it: the creator (also with a with block) and everyone that acquired it
+    (e.g. an asynchronous job). With on_disk, the upload is written to a file from
+    the start, it can be written again after close (e.g. by several requests).
+    """
+
+    def __init__(self, staging, suffix="", on_disk=False):
+        self.staging = staging
+        self.suffix = suffix
+        self.size = 0
+        self.path = None
+        self._buffer = io.BytesIO()
+        self._data = None
+        self._file = None
+        self._owners = 1
+        self._lock = threading.Lock()
+        if on_disk:
+            self._file, self.path = staging._create_file(suffix)
+            self._buffer = None
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    def write(self, data):
+        if self.in_memory and self.size + len(data) > self.staging.max_memory:
+            self._roll_over()
+        if self.in_memory:
+            self._buffer.write(data)
+        else:
+            self.staging._reserve(len(data))
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def _roll_over(self):
+        data = self._buffer.getbuffer()
+        self.staging._reserve(len(data))
+        try:
+            self._file, self.path = self.staging._create_file(self.suffix)
+        except OSError:
+            self.staging._reserve(-len(data))
+            raise
+        self._file.write(data)
+        del data
+        self._buffer = None
+        logging.debug(f"staging {self.path} on disk")
+
+    def to_disk(self):
+        """Move a finished upload that is kept in memory to a file (within the quota)."""
+
+        if not self.in_memory:
+            return
+        data = self.source()
+        self.staging._reserve(len(data))
+        try:
+            f, path = self.staging._create_file(self.suffix)
+        except OSError:
+            self.staging._reserve(-len(data))
+            raise
+        with f:
+            f.write(data)
+        self.path = path
+        self._data = None
+        logging.debug(f"staging {self.path} on disk")
+
+    def truncate(self, size):
+        """Drop the data after the first size bytes (of a staged file)."""
+
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.truncate(size)
+        self.staging._reserve(size - self.size)
+        self.size = size
+
+    def close(self):
+        """Finish writing."""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._buffer is not None:
+            self._data = self._buffer.getvalue()
+            self._buffer = None
+
+    def source(self):
+        """The bytes of the upload (if it is in memory) or the path of its file."""
+
+        self.close()
+        return self._data if self.in_memory else str(self.path)
+
+    def acquire(self):
+        """Add an owner (that has to release the upload)."""
+
+        with self._lock:
+            self._owners += 1
+        return self
+
+    def release(self):
+        """Remove an owner, the upload is removed when it has no owners anymore."""
+
+        with self._lock:
+            self._owners -= 1
+            if self._owners > 0:
+                return
+        self.close()
+        self._data = None
+        if self.path is not None:
+            self.staging._remove_file(self.path, self.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -41,7 +41,7 @@ accepted_combinations = {
             7: "cellpy",  # MACCOR-S4000-UBHAM
             8: "cellpy",  # MACCOR-S4000-KIT
         },
-        3: {3: "xrd_custom"},  # XRD
+        3: {3: "xrd_custom", 4: "xrd_custom"},  # XRD  # STOE-STADI P
     },
     3: {  # CELLPY
         1: {0: "cellpy"},
@@ -0,0 +1,126 @@
+"""Vectorized reader for (multi-scan) x-ray diffraction text files."""
+
+import io
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import parallel
+from .staging import is_buffer
+
+# a line with only these characters (and white space) contains data, other (non-empty)
+# lines are headers, each header starts a new scan
+NUMBER_CHARACTERS = np.zeros(256, dtype=bool)
+NUMBER_CHARACTERS[np.frombuffer(b"0123456789+-.eE", dtype=np.uint8)] = True
+WHITE_SPACE = np.zeros(256, dtype=bool)
+WHITE_SPACE[np.frombuffer(b" \t\r\n\f\v", dtype=np.uint8)] = True
+
+
+def _parse(data):
+    """Parse the two-column data lines of data (bytes).
+
+    Returns the angles, intensities, for each row if it is the first row after a
+    header line (the start of a scan) and if there are header lines after the last row
+    (i.e. the first row of the data that follows starts a scan).
+    """
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=bool), False
+    line_starts = np.concatenate([[0], np.flatnonzero(buf == ord("\n")) + 1])
+    line_starts = line_starts[line_starts < len(buf)]
+    line_ends = np.append(line_starts[1:], len(buf))
+
+    # classify all lines at once (lookup tables per byte, reduced per line)
+    white = WHITE_SPACE[buf]
+    empty = np.logical_and.reduceat(white, line_starts)
+    header = np.logical_or.reduceat(~white & ~NUMBER_CHARACTERS[buf], line_starts)
+    is_data = ~empty & ~header
+
+    # only the runs of data (and empty) lines are given to the (C) tokenizer
+    runs = np.flatnonzero(np.diff(np.concatenate([[0], (~header).astype(np.int8), [0]])))
+    segments = [
+        data[line_starts[first_line] : line_ends[end_line - 1]]
+        for first_line, end_line in zip(runs[::2], runs[1::2])
+    ]
+    if is_data.any():
+        values = pd.read_csv(
+            io.BytesIO(b"".join(segments)),
+            sep=r"\s+",
+            header=None,
+            names=["2theta", "intensity"],
+            usecols=[0, 1],
+            index_col=False,
+            dtype=np.float64,
+            engine="c",
+        )
+    else:
+        values = pd.DataFrame({"2theta": [], "intensity": []})
+
+    # a data line starts a scan if there is a header line since the previous data line
+    headers = np.cumsum(header)
+    headers_before = headers[is_data]
+    new_scan = np.diff(headers_before, prepend=0) > 0
+    return (
+        values["2theta"].to_numpy(),
+        values["intensity"].to_numpy(),
+        new_scan,
+        headers[-1] > (headers_before[-1] if len(headers_before) else 0),
+    )
+
+
+def _parse_range(file_name, start, end):
+    return _parse(parallel.read_range(file_name, start, end))
+
+
+def _join_parts(parts):
+    """Concatenate the parsed parts, a scan can start with the first row of a part."""
+
+    header_before = False
+    for _, _, new_scan, header_after in parts:
+        if header_before and len(new_scan):
+            new_scan[0] = True
+        header_before = header_after or (header_before and not len(new_scan))
+    return (np.concatenate([part[i] for part in parts]) for i in range(3))
+
+
+def normalize(intensity, scan):
+    """Divide the intensities of each scan by the maximum of the scan (in one pass)."""
+
+    if len(intensity) == 0:
+        return intensity
+    starts = np.flatnonzero(np.diff(scan, prepend=-1))
+    maxima = np.fmax.reduceat(intensity, starts)
+    return intensity / np.repeat(maxima, np.diff(np.append(starts, len(scan))))
+
+
+def read_xrd(file_name, workers=1):
+    """Read an x-ray diffraction file with one or more scans.
+
+    Lines that do not start with a number are headers, every header starts a new scan
+    (the data of a file without header lines is one scan). Returns a frame with 2theta,
+    the intensity normalized to the maximum of its scan and (for several scans) the
+    scan number (starting at 0). file_name can also be the content of the file (bytes).
+    """
+
+    if is_buffer(file_name):
+        two_theta, intensity, new_scan, _ = _parse(bytes(file_name))
+    elif workers > 1 and os.path.getsize(file_name) >= parallel.PARALLEL_MIN_SIZE:
+        parts = parallel.map_ranges(file_name, _parse_range, workers)
+        two_theta, intensity, new_scan = _join_parts(parts)
+    else:
+        with open(file_name, "rb") as f:
+            two_theta, intensity, new_scan, _ = _parse(f.read())
+
+    scan = np.cumsum(new_scan)
+    if len(scan) and new_scan[0]:
+        scan -= 1
+    df = pd.DataFrame(
+        {"2theta": two_theta, "intensity": normalize(intensity, scan)}
+    )
+    if len(scan) and scan[-1] > 0:
+        df["scan"] = scan
+    logging.debug(f"read {len(df)} rows ({scan[-1] + 1 if len(scan) else 0} scans)")
+    return df
@@ -16,6 +16,12 @@ included_packages = find_packages(exclude=["build", "docs", "templates"])
 
 requirements = ["flask", "cellpy>=1.0.1", "galvani", "werkzeug", "psycopg2"]
 
+extra_requirements = {
+    "arrow": ["pyarrow"],  # arrow and parquet responses
+    "zstd": ["zstandard"],  # zstd compressed uploads and responses
+    "isal": ["isal"],  # faster (and threaded) gzip decompression of uploads
+}
+
 test_requirements = requirements + [
     "black",
     "pytest",
@@ -32,6 +38,7 @@ setup(
     license="MIT",
     packages=included_packages,
     install_requires=requirements,
+    extras_require=extra_requirements,
     zip_safe=False,
     keywords="leafspy",
     classifiers=[
@@ -0,0 +1,60 @@
+"""Fixtures shared by the tests"""
+
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from leafspy import flask_server
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+MACCOR_FORM = {
+    "test_type": "CHARGE-DISCHARGE",
+    "test_type_subcategory": "GALVANOSTATIC CYCLING",
+    "instrument": "S4000-UBHAM",
+    "instrument_brand": "MACCOR",
+}
+
+
+@pytest.fixture
+def app_config(request):
+    """Settings of the app for a test (parametrize with indirect=True to change them)"""
+    return getattr(request, "param", {})
+
+
+@pytest.fixture
+def client(app_config, monkeypatch):
+    """Flask app client"""
+    for key, value in app_config.items():
+        monkeypatch.setitem(flask_server.app.config, key, value)
+    return flask_server.app.test_client()
+
+
+@pytest.fixture
+def upload(client):
+    """Post a maccor file to /upload_file.
+
+    The content (post-maccor-01.txt by default) is sent gzip compressed, the form
+    fields override the ones of MACCOR_FORM (and files the uploaded file).
+    """
+
+    def post(content=None, filename="upload.txt.gz", headers=None, **form):
+        if content is None:
+            content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+        data = {
+            **MACCOR_FORM,
+            "files": FileStorage(
+                stream=io.BytesIO(gzip.compress(content)), filename=filename
+            ),
+            **form,
+        }
+        return client.post(
+            "/upload_file",
+            data=data,
+            content_type="multipart/form-data",
+            headers=headers,
+        )
+
+    return post
@@ -1,7 +1,9 @@
 """Tests for leafspy"""
 
 import gzip
+import io
 import shutil
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import logging
 import tempfile
@@ -15,12 +17,6 @@ from leafspy.data_handler import _cellpy_instruments, transform_data_cellpy
 FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
 
 
-@pytest.fixture
-def client():
-    """Flask app client"""
-    return flask_server.app.test_client()
-
-
 def test_import(client):
     pass
 
@@ -344,3 +340,181 @@ def test_cellpy_instrument(
     )
     assert cellpy_instrument == cellpy_instrument_out
     assert data_format_model == data_format_model_out
+
+
+def test_upload_file_post_multiple_files(client, tmp_path):
+    test_file_path = FIXTURE_DIR / "post-maccor-01.txt"
+    temp_gz_file_path = tmp_path / "maccor_test_file.txt.gz"
+    with open(test_file_path, "rb") as f_in:
+        with gzip.open(temp_gz_file_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    broken_gz_file_path = tmp_path / "broken_test_file.txt.gz"
+    broken_gz_file_path.write_bytes(b"not a gzip file")
+
+    url = "/upload_file"
+    data = {
+        "test_type": "CHARGE-DISCHARGE",
+        "test_type_subcategory": "GALVANOSTATIC CYCLING",
+        "instrument": "S4000-UBHAM",
+        "instrument_brand": "MACCOR",
+        "files": [
+            FileStorage(stream=open(temp_gz_file_path, "rb"), filename="channel_1.txt.gz"),
+            FileStorage(stream=open(broken_gz_file_path, "rb"), filename="channel_2.txt.gz"),
+            FileStorage(stream=open(temp_gz_file_path, "rb"), filename="channel_3.txt"),
+            FileStorage(stream=open(temp_gz_file_path, "rb"), filename="channel_4.txt.gz"),
+        ],
+    }
+
+    response = client.post(url, data=data, content_type="multipart/form-data")
+    payload = response.get_json()
+
+    assert response.status_code == 200
+    assert payload["Code"] == 1
+    assert [f["Code"] for f in payload["files"]] == [0, 1, 1, 0]
+    assert payload["files"][0]["filename"] == "channel_1"
+    assert "experiment_data" in payload["files"][0].keys()
+    assert payload["files"][0]["experiment_data"] == payload["files"][3]["experiment_data"]
+    assert payload["files"][2]["Message"].startswith("Only compressed files allowed")
+    assert payload["files"][1]["Message"] == "File is not a valid gzip file"
+
+
+def test_upload_file_post_multiple_files_worker_failed(client, monkeypatch):
+    content = gzip.compress((FIXTURE_DIR / "post-maccor-01.txt").read_bytes())
+    manager = flask_server.job_manager()
+    submit = manager.submit
+
+    def submit_once_broken(*args, **kwargs):
+        if not hasattr(submit_once_broken, "failed"):
+            submit_once_broken.failed = True
+            raise BrokenProcessPool("A child process terminated abruptly")
+        return submit(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "submit", submit_once_broken)
+    monkeypatch.setitem(flask_server.app.config, "CACHE_ENABLED", False)
+    monkeypatch.setattr(flask_server, "_conversion_cache", None)
+    jobs = len(manager.jobs)
+    data = {
+        "test_type": "CHARGE-DISCHARGE",
+        "test_type_subcategory": "GALVANOSTATIC CYCLING",
+        "instrument": "S4000-UBHAM",
+        "instrument_brand": "MACCOR",
+        "files": [
+            FileStorage(stream=io.BytesIO(content), filename=f"channel_{i}.txt.gz")
+            for i in range(2)
+        ],
+    }
+
+    response = client.post("/upload_file", data=data, content_type="multipart/form-data")
+    payload = response.get_json()
+
+    assert response.status_code == 200
+    assert [f["Code"] for f in payload["files"]] == [1, 0]
+    assert len(manager.jobs) == jobs
+
+
+def _channel_files(content, count):
+    return [
+        FileStorage(stream=io.BytesIO(content), filename=f"channel_{i}.txt.gz")
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("app_config", [{"CACHE_ENABLED": False}], indirect=True)
+def test_upload_file_post_multiple_files_queue_full(upload, monkeypatch):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    manager = flask_server.job_manager()
+    monkeypatch.setattr(flask_server, "_conversion_cache", None)
+    # more files than queue slots: the later ones wait for the earlier ones
+    monkeypatch.setattr(manager, "max_queued", 2)
+
+    payload = upload(files=_channel_files(gzip.compress(content), 4)).get_json()
+
+    assert [f["Code"] for f in payload["files"]] == [0, 0, 0, 0]
+
+
+@pytest.mark.parametrize("app_config", [{"CACHE_ENABLED": False}], indirect=True)
+def test_upload_file_post_multiple_files_job_removed(upload, monkeypatch):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    manager = flask_server.job_manager()
+    monkeypatch.setattr(flask_server, "_conversion_cache", None)
+    monkeypatch.setattr(manager, "wait", lambda job_id, timeout=None: None)
+
+    response = upload(files=_channel_files(gzip.compress(content), 2))
+
+    assert response.status_code == 200
+    assert [f["Code"] for f in response.get_json()["files"]] == [1, 1]
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ({}, None),
+        (
+            {"include": "summary"},
+            {"tables": ["summary"], "columns": {"data": [], "summary": []}},
+        ),
+        (
+            {"fields": "voltage, raw.current,summary.cycle_index"},
+            {
+                "tables": ["data", "summary"],
+                "columns": {"data": ["voltage", "current"], "summary": ["cycle_index"]},
+            },
+        ),
+        (
+            {"include": "raw", "fields": "summary.cycle_index"},
+            {"tables": ["data"], "columns": {"data": [], "summary": ["cycle_index"]}},
+        ),
+    ],
+)
+def test_parse_projection(values, expected):
+    assert flask_server.parse_projection(values) == expected
+
+
+def test_maccor_projection(tmp_path):
+    test_file = "post-maccor-01.txt"
+    temp_file_path = tmp_path / test_file
+    shutil.copy2(FIXTURE_DIR / test_file, temp_file_path)
+
+    success, data = transform_data_cellpy(
+        temp_file_path,
+        instrument="MACCOR-S4000-UBHAM",
+        test_type="CHARGE-DISCHARGE-GALVANOSTATIC CYCLING",
+        extension="TXT",
+        projection={
+            "tables": ["data"],
+            "columns": {"data": ["test_time", "voltage", "unknown"], "summary": []},
+        },
+    )
+
+    assert success
+    assert "experiment_summary" not in data.keys()
+    assert list(data["experiment_data"].columns) == ["test_time", "voltage"]
+
+
+def test_upload_file_post_maccor_summary_only(client, tmp_path):
+    test_file_path = FIXTURE_DIR / "post-maccor-01.txt"
+    temp_gz_file_path = tmp_path / "maccor_test_file.txt.gz"
+    with open(test_file_path, "rb") as f_in:
+        with gzip.open(temp_gz_file_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+
+    url = "/upload_file"
+    data = {
+        "test_type": "CHARGE-DISCHARGE",
+        "test_type_subcategory": "GALVANOSTATIC CYCLING",
+        "instrument": "S4000-UBHAM",
+        "instrument_brand": "MACCOR",
+        "fields": "summary.cycle_index,summary.discharge_capacity",
+        "files": FileStorage(
+            stream=open(temp_gz_file_path, "rb"), filename="maccor_test_file.txt.gz"
+        ),
+    }
+
+    response = client.post(url, data=data, content_type="multipart/form-data")
+    payload = response.get_json()
+
+    assert "experiment_data" not in payload.keys()
+    assert payload["experiment_summary"]["columns"] == [
+        "cycle_index",
+        "discharge_capacity",
+    ]
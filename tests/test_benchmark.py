@@ -0,0 +1,86 @@
+"""Tests for the converter benchmark (dev/benchmark.py)"""
+
+import copy
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+BENCHMARK = Path(__file__).parents[1].resolve() / "dev" / "benchmark.py"
+
+
+@pytest.fixture(scope="module")
+def benchmark():
+    spec = importlib.util.spec_from_file_location("benchmark", BENCHMARK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_run_case(benchmark):
+    case = benchmark.run_case("xrd-synthetic", scale=0.01)
+
+    assert case["rows"] == benchmark.XRD_ROWS // 100
+    assert list(case["stages"]) == benchmark.STAGES
+    for measured in case["stages"].values():
+        assert measured["seconds"] > 0
+        assert measured["peak_rss"] > 0
+        assert measured["rows_per_second"] > 0
+
+
+def test_compare(benchmark):
+    baseline = {
+        "cases": {
+            "xrd-synthetic": {
+                "rows": 1000,
+                "stages": {
+                    "convert": {"seconds": 1.0, "peak_rss": 100 * 1024**2},
+                    "json": {"seconds": 0.01, "peak_rss": 100 * 1024**2},
+                },
+            }
+        }
+    }
+    results = copy.deepcopy(baseline)
+    stages = results["cases"]["xrd-synthetic"]["stages"]
+    stages["convert"]["seconds"] = 1.2
+    stages["json"]["seconds"] = 0.03  # slower, but below MIN_SECONDS
+    assert benchmark.compare(results, baseline, threshold=0.25) == []
+
+    stages["convert"]["seconds"] = 1.5
+    stages["json"]["peak_rss"] = 200 * 1024**2
+    regressions = benchmark.compare(results, baseline, threshold=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("xrd-synthetic/convert: seconds 1.500s")
+
+    results["cases"]["xrd-synthetic"] = {"error": "ValueError: broken"}
+    assert benchmark.compare(results, baseline) == ["xrd-synthetic: ValueError: broken"]
+
+
+def test_committed_baseline(benchmark):
+    baseline = json.loads(benchmark.BASELINE.read_text())
+
+    assert set(baseline["cases"]) == set(benchmark.CASES)
+    assert baseline["scale"] == 1.0
+    for name in ["maccor-ubham", "maccor-kit", "xrd-synthetic", "mpr-synthetic"]:
+        assert list(baseline["cases"][name]["stages"]) == benchmark.STAGES
+
+
+def test_main_baseline(benchmark, monkeypatch, tmp_path):
+    case = {
+        "rows": 1000,
+        "stages": {"convert": {"seconds": 1.0, "peak_rss": 100 * 1024**2}},
+    }
+    baseline = {"scale": 1.0, "cases": {"xrd-synthetic": case}}
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(baseline))
+    results = copy.deepcopy(baseline)
+    monkeypatch.setattr(benchmark, "run", lambda *args: results)
+    monkeypatch.setattr(benchmark, "report", lambda results: "")
+
+    arguments = ["--cases", "xrd-synthetic", "--baseline", str(path)]
+    assert benchmark.main(arguments) == 0
+    results["cases"]["xrd-synthetic"]["stages"]["convert"]["seconds"] = 2.0
+    assert benchmark.main(arguments) == 1
+    # baselines of another scale are not compared
+    assert benchmark.main([*arguments, "--scale", "2"]) == 0
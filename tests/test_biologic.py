@@ -0,0 +1,112 @@
+"""Tests for the memory-mapped BioLogic .mpr reader"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from galvani import BioLogic
+
+from leafspy.biologic import read_mpr
+from leafspy.data_handler import transform_data_galvani
+
+START = datetime(2016, 6, 16, 11, 52, 12)
+# mode, ox/red, time/s, Ewe/V, <I>/mA, cycle number
+COLUMN_IDS = [1, 2, 4, 6, 11, 24]
+
+
+def _module(shortname, longname, data, version=0, date=b"06/16/16"):
+    header = np.zeros(
+        1,
+        dtype=[
+            ("shortname", "S10"),
+            ("longname", "S25"),
+            ("length", "<u4"),
+            ("version", "<u4"),
+            ("date", "S8"),
+        ],
+    )
+    header[0] = (shortname.ljust(10), longname.ljust(25), len(data), version, date)
+    return b"MODULE" + header.tobytes() + data
+
+
+def _write_mpr(path, rows, claimed_rows=None):
+    rng = np.random.default_rng(0)
+    dtype, _ = BioLogic.VMPdata_dtype_from_colIDs(COLUMN_IDS)
+    records = np.zeros(rows, dtype=dtype)
+    records["flags"] = rng.integers(1, 3, rows) | (rng.integers(0, 2, rows) << 2)
+    records["time/s"] = np.arange(rows) * 0.5
+    records["Ewe/V"] = rng.uniform(2.5, 4.2, rows)
+    records["<I>/mA"] = rng.uniform(-1, 1, rows)
+    records["cycle number"] = np.arange(rows) // 100
+
+    columns = np.array(COLUMN_IDS, dtype="<u2").tobytes()
+    data = (
+        np.array([claimed_rows or rows], dtype="<u4").tobytes()
+        + bytes([len(COLUMN_IDS)])
+        + columns
+    ).ljust(405, b"\x00") + records.tobytes()
+    log = bytearray(600)
+    days = (START - datetime(1899, 12, 30)).total_seconds() / 86400
+    log[465:473] = np.array([days], dtype="<f8").tobytes()
+
+    with open(path, "wb") as f:
+        f.write(BioLogic.MPR_MAGIC)
+        f.write(_module(b"VMP Set", b"VMP settings", bytes(100)))
+        f.write(_module(b"VMP data", b"VMP data", data, version=2))
+        f.write(_module(b"VMP LOG", b"VMP LOG", bytes(log)))
+    return path
+
+
+def test_read_mpr_parity(tmp_path):
+    path = _write_mpr(tmp_path / "cv.mpr", 1000)
+
+    df, info = read_mpr(path)
+
+    expected = pd.DataFrame(BioLogic.MPRfile(str(path)).data)
+    pd.testing.assert_frame_equal(df[expected.columns], expected)
+    assert df["mode"].isin([1, 2]).all()
+    assert df["ox/red"].dtype == bool
+    assert info["data points"] == 1000
+    assert info["start date"] == "2016-06-16"
+    assert info["acquisition started on"] == "2016-06-16 11:52:12"
+    assert [module["name"] for module in info["modules"]] == [
+        "VMP settings",
+        "VMP data",
+        "VMP LOG",
+    ]
+
+
+def test_read_mpr_truncated(tmp_path):
+    path = _write_mpr(tmp_path / "cv.mpr", 10, claimed_rows=11)
+
+    with pytest.raises(ValueError, match="Expected 11 rows"):
+        read_mpr(path)
+
+
+def test_read_mpr_not_mpr(tmp_path):
+    path = tmp_path / "cv.mpr"
+    path.write_bytes(b"not an mpr file" * 10)
+
+    with pytest.raises(ValueError, match="Invalid magic"):
+        read_mpr(path)
+
+
+def test_transform_data_galvani(tmp_path):
+    path = _write_mpr(tmp_path / "cv.mpr", 1000)
+
+    success, data = transform_data_galvani(path, projection=None)
+
+    assert success
+    assert len(data["experiment_data"]) == 1000
+    assert data["experiment_info"]["data points"] == 1000
+    # the file is removed by the staging area, not by the converter
+    assert path.exists()
+
+    success, from_memory = transform_data_galvani(path.read_bytes(), projection=None)
+
+    assert success
+    pd.testing.assert_frame_equal(
+        from_memory["experiment_data"], data["experiment_data"]
+    )
+    assert from_memory["experiment_info"] == data["experiment_info"]
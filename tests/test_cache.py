@@ -0,0 +1,106 @@
+"""Tests for the conversion cache"""
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from leafspy import flask_server
+from leafspy.cache import ConversionCache
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(tmp_path / "cache", max_size=10**9, versions={"cellpy": "1"})
+
+
+@pytest.fixture
+def app_config(tmp_path, monkeypatch):
+    """With a fresh conversion cache"""
+    monkeypatch.setattr(flask_server, "_conversion_cache", None)
+    return {"CACHE_FOLDER": tmp_path / "cache"}
+
+
+def test_cache_key():
+    key = ConversionCache.key("abc", data_converter="cellpy", model="S4000-KIT")
+    assert key == ConversionCache.key("abc", model="S4000-KIT", data_converter="cellpy")
+    assert key != ConversionCache.key("abc", data_converter="cellpy", model="S4000-WMG")
+    assert key != ConversionCache.key("abd", data_converter="cellpy", model="S4000-KIT")
+
+
+def test_cache_hit_and_miss(cache):
+    data = {"experiment_data": pd.DataFrame({"voltage": [3.0, 4.0]})}
+
+    assert cache.get("key") is None
+    cache.put("key", data)
+    cached = cache.get("key")
+
+    pd.testing.assert_frame_equal(cached["experiment_data"], data["experiment_data"])
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_cache_lru_eviction(cache):
+    for key in ["a", "b", "c"]:
+        cache.put(key, {"payload": bytes(1000)})
+    for i, key in enumerate(["b", "a", "c"]):
+        os.utime(cache.directory / f"{key}.pickle", (1000 + i, 1000 + i))
+
+    cache.max_size = 2500
+    cache.evict()
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entry_removed_meanwhile(cache, monkeypatch):
+    for key in ["a", "b"]:
+        cache.put(key, {"payload": bytes(1000)})
+    entries = cache._entries()
+    # removed by another process after the directory was scanned
+    os.remove(cache.directory / "a.pickle")
+    monkeypatch.setattr(cache, "_entries", lambda: entries)
+
+    cache.max_size = 0
+    assert cache.stats()["entries"] == 1
+    cache.evict()
+
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_invalidate_on_upgrade(cache):
+    cache.put("key", {"payload": 1})
+
+    upgraded = ConversionCache(cache.directory, 10**9, versions={"cellpy": "2"})
+    assert upgraded.purge_stale() == 1
+    assert cache.get("key") is None
+
+
+def test_upload_file_post_maccor_cached(client, upload):
+    payloads = [upload().get_json() for _ in range(2)]
+
+    stats = client.get("/cache").get_json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert payloads[0] == payloads[1]
+
+
+def test_upload_file_post_maccor_append(client, upload):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    grown = content.index(b"\n", len(content) // 2) + 1
+
+    upload(content[:grown], append="true")
+    # the checkpoint is stored next to the result
+    assert client.get("/cache").get_json()["entries"] == 2
+
+    appended = upload(content, append="true").get_json()
+    assert client.get("/cache").get_json()["hits"] == 1
+
+    flask_server.conversion_cache().clear()
+    assert appended == upload(content).get_json()
@@ -0,0 +1,86 @@
+"""Tests for the compact dtype mode"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from leafspy.compact import compact_frame, float32_as_decimal
+from leafspy.data_handler import transform_data_xrd
+from leafspy.responses import iter_json
+
+
+def _frame(rows=1000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "data_point": np.arange(1, rows + 1, dtype=np.float64),
+            "cycle_index": np.arange(rows) // 100 + 1,
+            "voltage": rng.uniform(2.5, 4.2, rows),
+            # a millisecond resolution after a long test does not fit in float32
+            "test_time": 1e7 + np.arange(rows) * 0.001,
+            "date_time": pd.date_range("2021-05-13", periods=rows, freq="s"),
+            "state": np.where(np.arange(rows) % 2, "C", "D").astype(object),
+        },
+        index=pd.Index(np.arange(1, rows + 1), name="data_point"),
+    )
+
+
+def test_compact_frame():
+    df = _frame()
+
+    compact, saved = compact_frame(df)
+
+    assert compact["data_point"].dtype == np.int16
+    assert compact["cycle_index"].dtype == np.int8
+    assert compact["voltage"].dtype == np.float32
+    assert compact["test_time"].dtype == np.float64
+    assert compact["date_time"].dtype == np.int64
+    assert compact["date_time"].iat[0] == 1620864000000
+    assert compact["state"].dtype == "category"
+    assert compact.index.dtype == np.int16
+    assert saved == (
+        df.memory_usage(index=True, deep=True).sum()
+        - compact.memory_usage(index=True, deep=True).sum()
+    )
+    assert saved > 0
+    np.testing.assert_allclose(compact["voltage"], df["voltage"], rtol=1e-7)
+
+
+def test_float32_as_decimal():
+    values = np.array([0.1, 3.91234, -1.5e-5, 0.0, np.nan], dtype=np.float32)
+
+    decimal = float32_as_decimal(values)
+
+    np.testing.assert_array_equal(decimal[:4], [0.1, 3.91234, -1.5e-5, 0.0])
+    assert np.isnan(decimal[4])
+
+
+def test_iter_json_float32():
+    df = pd.DataFrame({"voltage": np.array([0.1, 3.91234], dtype=np.float32)})
+
+    encoded = json.loads("".join(iter_json(df, chunk_rows=1)))
+
+    assert encoded["data"] == [[0.1], [3.91234]]
+
+
+def test_transform_data_xrd_compact(tmp_path):
+    path = tmp_path / "xrd.txt"
+    lines = [f"{10 + i * 0.01:.2f} {i % 97}\n" for i in range(1000)]
+    path.write_text("2Theta Intensity\n" + "".join(lines))
+
+    success, data = transform_data_xrd(path, compact=True)
+
+    assert success
+    assert (data["experiment_data"].dtypes == np.float32).all()
+    assert data["compact"]["saved_bytes"] == 8000
+
+
+def test_upload_file_post_compact(upload):
+    response = upload(compact="1")
+    payload = response.get_json()
+
+    assert payload["compact"]["saved_bytes"] > 0
+    columns = payload["experiment_data"]["columns"]
+    row = payload["experiment_data"]["data"][0]
+    assert isinstance(row[columns.index("date_time")], int)
@@ -0,0 +1,74 @@
+"""Tests for the response compression"""
+
+import gzip
+
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from leafspy import flask_server
+from leafspy.compression import compress_chunks, negotiate_encoding, peek_chunks
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate, br", "gzip"),
+        ("zstd, gzip", "zstd"),
+        ("gzip;q=0.5, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("*", "zstd"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding(header, expected):
+    accept = parse_accept_header(header, Accept)
+
+    assert negotiate_encoding(accept, ["zstd", "gzip"]) == expected
+
+
+def test_compress_chunks():
+    chunks = ["{", '"a":' * 1000, b"1", "}"]
+    head, size, rest = peek_chunks(iter(chunks), 100)
+
+    assert head == chunks[:2]
+    assert size == 4001
+    body = b"".join(compress_chunks(head, rest, "gzip"))
+    assert gzip.decompress(body) == ("{" + '"a":' * 1000 + "1}").encode()
+
+
+def test_upload_compressed(upload):
+    plain = upload()
+    compressed = upload(headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Length" not in compressed.headers
+    assert len(compressed.get_data()) < len(plain.get_data()) / 5
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+
+def test_upload_compressed_zstd(upload):
+    zstandard = pytest.importorskip("zstandard")
+
+    plain = upload()
+    compressed = upload(headers={"Accept-Encoding": "gzip, zstd"})
+
+    assert compressed.headers["Content-Encoding"] == "zstd"
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    assert decompressor.decompress(compressed.get_data()) == plain.get_data()
+
+
+def test_small_and_binary_responses_not_compressed(client, upload, monkeypatch):
+    small = client.get("/ready", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+    npz = upload(headers={"Accept-Encoding": "gzip"}, response_format="npz")
+    assert npz.status_code == 200
+    assert "Content-Encoding" not in npz.headers
+
+    monkeypatch.setitem(flask_server.app.config, "COMPRESS_RESPONSES", False)
+    response = upload(headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
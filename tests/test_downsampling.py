@@ -0,0 +1,73 @@
+"""Tests for the downsampling of experiment data"""
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from leafspy.downsampling import build_pyramid, lttb, select_rows
+
+
+@pytest.fixture
+def frame():
+    test_time = np.linspace(0, 36_000, 100_000)
+    return pd.DataFrame(
+        {
+            "test_time": test_time,
+            "voltage": 3.5 + 0.5 * np.sin(test_time / 3600),
+            "current": np.sign(np.sin(test_time / 3600)) * 0.01,
+        }
+    )
+
+
+def test_lttb_keeps_end_points_and_peaks():
+    x = np.arange(100.0)
+    y = np.zeros(100)
+    y[37] = 5.0
+
+    rows = lttb(x, y, 10)
+
+    assert len(rows) == 10
+    assert rows[0] == 0 and rows[-1] == 99
+    assert 37 in rows
+    assert np.all(np.diff(rows) > 0)
+
+
+def test_lttb_small_input():
+    np.testing.assert_array_equal(lttb([0, 1, 2], [1, 2, 3], 10), [0, 1, 2])
+
+
+def test_build_pyramid(frame):
+    pyramid = build_pyramid(frame, factor=4, min_points=1000)
+
+    assert pyramid["x"] == "test_time"
+    assert pyramid["y"] == ["voltage", "current"]
+    sizes = [len(level) for level in pyramid["levels"]]
+    assert len(sizes) >= 4
+    assert sizes == sorted(sizes, reverse=True)
+    assert all(size >= 1000 for size in sizes)
+
+
+def test_build_pyramid_unknown_columns():
+    assert build_pyramid(pd.DataFrame({"a": [1, 2], "b": [3, 4]})) is None
+
+
+def test_select_rows_view(frame):
+    pyramid = build_pyramid(frame)
+
+    rows = select_rows(frame, pyramid, 500, start=3600, end=7200)
+    selected = frame.iloc[rows]
+
+    assert len(rows) <= 500
+    assert len(rows) > 250
+    assert selected["test_time"].between(3600, 7200).all()
+
+
+def test_upload_file_post_maccor_max_points(upload):
+    response = upload(max_points="200")
+    payload = response.get_json()
+
+    assert payload["downsampling"]["points"] == len(payload["experiment_data"]["data"])
+    assert payload["downsampling"]["points"] <= 200
+    assert payload["downsampling"]["total_points"] > 200
+    assert "_pyramid" not in payload
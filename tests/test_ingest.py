@@ -0,0 +1,227 @@
+"""Tests for the streaming ingest of uploads"""
+
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from leafspy import flask_server, ingest
+from leafspy.data_handler import _clean_up_non_unicode_file
+from leafspy.ingest import (
+    CompressedDataError,
+    DecompressionLimitError,
+    peek_compressed,
+    spool_compressed,
+)
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+def test_spool_gzip(tmp_path):
+    content = b"1\t2\t3\n" * 100_000
+    location = tmp_path / "spooled.txt"
+
+    size = spool_compressed(
+        io.BytesIO(gzip.compress(content)), location, chunk_size=4096
+    )
+
+    assert size == len(content)
+    assert location.read_bytes() == content
+
+
+def test_spool_gzip_max_size(tmp_path):
+    location = tmp_path / "spooled.txt"
+    stream = io.BytesIO(gzip.compress(b"x" * 10_000))
+
+    with pytest.raises(DecompressionLimitError):
+        spool_compressed(stream, location, chunk_size=1024, max_size=5_000)
+    assert not location.exists()
+
+
+def test_spool_gzip_max_ratio(tmp_path):
+    location = tmp_path / "spooled.txt"
+    stream = io.BytesIO(gzip.compress(bytes(64 * 1024 * 1024)))
+
+    with pytest.raises(DecompressionLimitError):
+        spool_compressed(stream, location, max_ratio=100)
+    assert not location.exists()
+
+
+@pytest.mark.parametrize("app_config", [{"MAX_DECOMPRESSED_SIZE": 1000}], indirect=True)
+def test_upload_file_post_decompression_limit(upload):
+    response = upload(b"1\t0.1\t3.9\n" * 1000, instrument="S4000")
+
+    assert response.status_code == 413
+    assert response.get_json()["Code"] == 2
+
+
+def test_spool_gzip_transcode(tmp_path):
+    content = "Temp. [°C]\t€\n".encode("utf-8") * 1000 + b"\xff\xfe\x00junk\n"
+    location = tmp_path / "spooled.txt"
+
+    # chunks of 7 bytes split the multi-byte characters
+    size = spool_compressed(
+        io.BytesIO(gzip.compress(content)), location, chunk_size=7, encoding="utf-8"
+    )
+
+    assert size == len(content)
+    assert location.read_bytes() == content.decode("utf-8", errors="replace").encode(
+        "utf-8"
+    )
+
+
+def test_spool_gzip_transcode_auto(tmp_path):
+    content = "Rec\tVolts\n1\t3,9\n".encode("utf-16")
+    location = tmp_path / "spooled.txt"
+
+    spool_compressed(io.BytesIO(gzip.compress(content)), location, encoding="auto")
+
+    assert location.read_bytes() == b"Rec\tVolts\n1\t3,9\n"
+
+
+def test_spool_gzip_transcode_kit(tmp_path):
+    """Transcoding while spooling gives the same file as the clean-up after spooling."""
+    content = (FIXTURE_DIR / "post-maccor-03.txt").read_bytes()
+    location = tmp_path / "spooled.txt"
+    cleaned = tmp_path / "cleaned.txt"
+    cleaned.write_bytes(content)
+    _clean_up_non_unicode_file(cleaned)
+
+    spool_compressed(
+        io.BytesIO(gzip.compress(content)), location, chunk_size=4096, encoding="utf-8"
+    )
+
+    # (the clean-up also converted the line endings)
+    assert location.read_bytes().splitlines() == cleaned.read_bytes().splitlines()
+
+
+def test_upload_encoding():
+    # the native reader decodes the KIT files itself
+    assert flask_server.upload_encoding("MACCOR-S4000-KIT") is None
+    assert flask_server.upload_encoding("MACCOR-S4000-KIT", "latin-1") == "latin-1"
+
+
+@pytest.mark.parametrize(
+    "encoding, header_encoding",
+    [("latin-1", "latin-1"), ("utf-8", "utf-8"), ("auto", "utf-8"), (None, "latin-1")],
+)
+def test_upload_file_post_transcoded_header(upload, encoding, header_encoding):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    header = "\tTemp °C\t".encode(header_encoding)
+    content = content.replace(b"\tVAR1\t", header, 1)
+    if encoding is None:
+        # the native reader decodes untranscoded files as ISO-8859-1
+        encoding = ""
+
+    payload = upload(content, encoding=encoding).get_json()
+
+    assert "Temp °C" in payload["experiment_data"]["columns"]
+
+
+@pytest.mark.parametrize(
+    "brand, instrument, test_type, encoding, message",
+    [
+        ("MACCOR", "S4000", "CHARGE-DISCHARGE", "no-such-codec", "Unknown encoding"),
+        ("BIOLOGIC", "VMP3", "VOLTAMMETRY", "latin-1", "only supported for Maccor"),
+    ],
+)
+def test_upload_file_post_encoding_rejected(
+    client, brand, instrument, test_type, encoding, message
+):
+    extension = "txt" if brand == "MACCOR" else "mpr"
+    tmp_file = FileStorage(
+        stream=io.BytesIO(gzip.compress(b"1\t0.1\t3.9\n")),
+        filename=f"test_file.{extension}.gz",
+    )
+    data = {
+        "test_type": test_type,
+        "test_type_subcategory": (
+            "GALVANOSTATIC CYCLING" if brand == "MACCOR" else "CYCLIC VOLTAMMETRY (CV)"
+        ),
+        "instrument": instrument,
+        "instrument_brand": brand,
+        "encoding": encoding,
+        "files": tmp_file,
+    }
+    response = client.post("/upload_file", data=data, content_type="multipart/form-data")
+
+    assert response.get_json()["Code"] == 1
+    assert message in response.get_json()["Message"]
+
+
+def _compress(compression, content):
+    if compression == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        return zstandard.ZstdCompressor().compress(content)
+    return {"gzip": gzip, "xz": lzma, "bz2": bz2}[compression].compress(content)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd", "xz", "bz2"])
+@pytest.mark.parametrize("threads", [0, 1])
+def test_spool_compressed(tmp_path, compression, threads):
+    content = b"1\t2\t3\n" * 100_000
+    location = tmp_path / "spooled.txt"
+
+    detected, head, stream = peek_compressed(
+        io.BytesIO(_compress(compression, content)), 1000, chunk_size=100
+    )
+    size = spool_compressed(
+        stream, location, detected, threads=threads, chunk_size=4096
+    )
+
+    assert detected == compression
+    assert head == content[:1000]
+    assert size == len(content)
+    assert location.read_bytes() == content
+
+
+def test_spool_compressed_threaded_limit(tmp_path):
+    location = tmp_path / "spooled.txt"
+    stream = io.BytesIO(lzma.compress(b"x" * 100_000))
+
+    with pytest.raises(DecompressionLimitError):
+        spool_compressed(
+            stream, location, "xz", threads=1, chunk_size=1024, max_size=5_000
+        )
+    assert not location.exists()
+
+
+def test_spool_zstd_long_window(tmp_path, monkeypatch):
+    zstandard = pytest.importorskip("zstandard")
+    content = bytes(range(256)) * 20_000
+    parameters = zstandard.ZstdCompressionParameters.from_level(
+        3, window_log=22, enable_ldm=True
+    )
+    # streamed, so the frame has the full window (the content size is unknown)
+    compressor = zstandard.ZstdCompressor(compression_params=parameters).compressobj()
+    compressed = compressor.compress(content) + compressor.flush()
+    location = tmp_path / "spooled.txt"
+
+    monkeypatch.setattr(ingest, "ZSTD_WINDOW_LOG_MAX", 22)
+    assert spool_compressed(io.BytesIO(compressed), location, "zstd") == len(content)
+    assert location.read_bytes() == content
+
+    monkeypatch.setattr(ingest, "ZSTD_WINDOW_LOG_MAX", 20)
+    with pytest.raises(CompressedDataError):
+        spool_compressed(io.BytesIO(compressed), location, "zstd")
+    assert not location.exists()
+
+
+@pytest.mark.parametrize(
+    "compression, suffix", [("xz", "xz"), ("bz2", "bz2"), ("zstd", "zst"), ("xz", "gz")]
+)
+def test_upload_file_post_compressed(upload, compression, suffix):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    response = upload(
+        files=FileStorage(
+            stream=io.BytesIO(_compress(compression, content)),
+            filename=f"maccor.test.txt.{suffix}",
+        )
+    )
+
+    assert response.status_code == 200
+    assert "experiment_data" in response.get_json()
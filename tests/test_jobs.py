@@ -0,0 +1,113 @@
+"""Tests for the asynchronous conversion jobs"""
+
+import math
+import os
+import time
+
+import pytest
+
+from leafspy import flask_server
+from leafspy.jobs import JobManager, JobQueueFull
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_queued=2)
+    yield manager
+    manager.shutdown()
+
+
+def _wait(manager, job_id, timeout=120):
+    end = time.time() + timeout
+    while manager.status(job_id)["status"] in ["queued", "running"]:
+        assert time.time() < end
+        time.sleep(0.05)
+    return manager.status(job_id)
+
+
+def test_job_manager_done(manager):
+    stored = []
+    job_id = manager.submit(divmod, 7, 1, on_success=stored.append)
+
+    status = _wait(manager, job_id)
+
+    assert status["status"] == "done"
+    assert manager.get(job_id).data == 0
+    assert stored == [0]
+
+
+def test_job_manager_failed(manager):
+    job_id = manager.submit(math.sqrt, -1)
+
+    status = _wait(manager, job_id)
+
+    assert status["status"] == "failed"
+    assert "math domain error" in status["error"]
+
+
+def test_job_manager_queue_depth(manager):
+    manager.add_finished("cached")
+    manager.submit(time.sleep, 1)
+    manager.submit(time.sleep, 1)
+    with pytest.raises(JobQueueFull):
+        manager.submit(time.sleep, 1)
+
+
+def _crash():
+    os._exit(1)
+
+
+def test_job_manager_broken_pool(manager):
+    manager.max_queued = 3
+    crashed = manager.submit(_crash)
+    assert _wait(manager, crashed)["status"] == "failed"
+    assert "BrokenProcessPool" in manager.status(crashed)["error"]
+
+    # the pool is replaced, no job is left behind
+    for _ in range(3):
+        assert _wait(manager, manager.submit(divmod, 7, 1))["status"] == "done"
+    assert manager._unfinished() == 0
+
+
+def test_job_manager_submit_broken_pool(manager):
+    job_id = manager.submit(_crash)
+    _wait(manager, job_id)
+    executor = manager.executor
+    executor.shutdown()
+    # a pool that can not take jobs anymore
+    executor._broken = "broken"
+    manager._executor = executor
+
+    assert _wait(manager, manager.submit(divmod, 7, 1))["status"] == "done"
+    assert manager.executor is not executor
+
+
+def test_job_manager_max_results(manager):
+    manager.max_results = 2
+    first = manager.add_finished("first")
+    manager.add_finished("second")
+    manager.add_finished("third")
+    manager.add_finished("fourth")
+
+    assert manager.get(first) is None
+    assert len(manager.jobs) == 3
+
+
+def test_job_status_unknown(client):
+    response = client.get("/jobs/does-not-exist")
+    assert response.status_code == 404
+    assert response.get_json()["Code"] == 1
+
+
+def test_upload_file_post_maccor_async(client, upload):
+    response = upload(**{"async": "1"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    status = _wait(flask_server.job_manager(), job_id)
+    assert status["status"] == "done"
+    assert client.get(f"/jobs/{job_id}").get_json()["status"] == "done"
+
+    payload = client.get(f"/jobs/{job_id}/result").get_json()
+    assert "experiment_data" in payload.keys()
+    assert "experiment_info" in payload.keys()
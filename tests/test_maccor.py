@@ -0,0 +1,228 @@
+"""Tests for the native Maccor txt reader"""
+
+import shutil
+from pathlib import Path
+
+import cellpy
+import pandas as pd
+import pytest
+
+from leafspy.data_handler import (
+    _clean_up_non_unicode_file,
+    _native_maccor_cell,
+    transform_data_cellpy,
+)
+from leafspy.maccor import read_maccor_txt
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+@pytest.fixture
+def cellpy_compatible_pandas(monkeypatch):
+    """Let cellpy split the current and capacity columns with pandas >= 2.
+
+    cellpy (1.0.3) calls Series.update(..., inplace=True), which raises a TypeError
+    in newer versions of pandas (all values are then left at 0).
+    """
+    update = pd.Series.update
+    monkeypatch.setattr(
+        pd.Series, "update", lambda self, other, inplace=None: update(self, other)
+    )
+
+
+def _cellpy_raw(tmp_path, file_name, model):
+    path = tmp_path / "cellpy" / file_name.name
+    path.parent.mkdir()
+    shutil.copy(file_name, path)
+    if model == "S4000-KIT":
+        _clean_up_non_unicode_file(path)
+    c = cellpy.get(filename=path, instrument="maccor_txt", model=model, auto_summary=False)
+    return c.data.raw
+
+
+def _write_wmg_file(tmp_path):
+    """Write a file in the S4000-WMG layout (from the S4000-UBHAM test file)."""
+
+    source = pd.read_csv(
+        FIXTURE_DIR / "post-maccor-01.txt",
+        sep="\t",
+        skiprows=3,
+        encoding="ISO-8859-1",
+        nrows=500,
+    )
+    wmg = pd.DataFrame(
+        {
+            "Rec#": source["Rec#"],
+            "Cyc#": source["Cyc#"],
+            "Step": source["Step"],
+            "TestTime": source["TestTime"],
+            "StepTime": source["StepTime"],
+            "mAmp-hr": source["Amp-hr"] * 1000,
+            "mWatt-hr": source["Watt-hr"] * 1000,
+            "mAmps": source["Amps"] * 1000,
+            "Volts": source["Volts"],
+            "State": source["State"],
+            "ES": source["ES"],
+            "DPt Time": source["DPt Time"],
+        }
+    )
+    path = tmp_path / "wmg.txt"
+    with open(path, "w", encoding="ISO-8859-1") as f:
+        f.write("Today's Date:\t14 December 2020\n\n")
+        f.write("Filename:\tWMG_test\n")
+        wmg.to_csv(f, sep="\t", index=False, decimal=",")
+    return path
+
+
+def _cycling_content(cycles, rows=300):
+    """A S4000-UBHAM file with several cycles (of the first rows of the test file)."""
+
+    lines = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes().split(b"\n")
+    data = [line for line in lines[4:] if line.strip()][:rows]
+    content = lines[:4]
+    for cycle in range(cycles):
+        for row, line in enumerate(data):
+            point = cycle * rows + row + 1
+            seconds = point * 5
+            fields = line.split(b"\t", 4)
+            fields[0] = str(point).encode()
+            fields[1] = str(cycle).encode()
+            minutes, seconds = divmod(seconds, 60)
+            fields[3] = f"  0d {minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}".encode()
+            content.append(b"\t".join(fields))
+    return b"\n".join(content) + b"\n"
+
+
+@pytest.mark.parametrize(
+    "file_name, model",
+    [("post-maccor-01.txt", "S4000-UBHAM"), ("post-maccor-03.txt", "S4000-KIT")],
+)
+def test_read_maccor_txt_parity(tmp_path, cellpy_compatible_pandas, file_name, model):
+    raw = read_maccor_txt(FIXTURE_DIR / file_name, model)
+    expected = _cellpy_raw(tmp_path, FIXTURE_DIR / file_name, model)
+
+    pd.testing.assert_frame_equal(raw, expected)
+    assert (raw["current"] != 0).any()
+    assert (raw["discharge_capacity"] != 0).any()
+
+
+def test_read_maccor_txt_parity_wmg(tmp_path, cellpy_compatible_pandas):
+    file_name = _write_wmg_file(tmp_path)
+
+    raw = read_maccor_txt(file_name, "S4000-WMG")
+    expected = _cellpy_raw(tmp_path, file_name, "S4000-WMG")
+
+    pd.testing.assert_frame_equal(raw, expected)
+
+
+def test_read_maccor_txt_columns():
+    raw = read_maccor_txt(
+        FIXTURE_DIR / "post-maccor-01.txt", "S4000-UBHAM", columns=["voltage", "Aux #1"]
+    )
+
+    assert "Aux #1" in raw.columns
+    assert "Aux #2" not in raw.columns
+    assert "discharge_capacity" in raw.columns
+
+
+def test_transform_data_cellpy_native_parity(tmp_path, cellpy_compatible_pandas):
+    results = []
+    for native_reader in [True, False]:
+        file_name = tmp_path / f"{native_reader}" / "maccor.txt"
+        file_name.parent.mkdir()
+        shutil.copy(FIXTURE_DIR / "post-maccor-03.txt", file_name)
+        success, data = transform_data_cellpy(
+            file_name,
+            instrument="MACCOR-S4000-KIT",
+            test_type="CHARGE-DISCHARGE-GALVANOSTATIC CYCLING",
+            extension="TXT",
+            native_reader=native_reader,
+        )
+        assert success
+        results.append(data)
+
+    for key in ["experiment_data", "experiment_summary"]:
+        pd.testing.assert_frame_equal(results[0][key], results[1][key])
+
+
+@pytest.mark.parametrize("columns", [None, ["voltage"]])
+def test_read_maccor_txt_resume(tmp_path, columns):
+    content = _cycling_content(cycles=6)
+    appended = content.index(b"\n", len(content) // 2) + 1
+    path = tmp_path / "maccor.txt"
+    path.write_bytes(content[:appended])
+    checkpoint = {}
+    read_maccor_txt(path, "S4000-UBHAM", columns, checkpoint=checkpoint)
+
+    path.write_bytes(content)
+    resumed = {}
+    raw = read_maccor_txt(
+        path, "S4000-UBHAM", columns, resume=checkpoint, checkpoint=resumed
+    )
+
+    assert resumed["resumed_rows"] == len(checkpoint["parsed"]) > 0
+    pd.testing.assert_frame_equal(
+        raw, read_maccor_txt(path, "S4000-UBHAM", columns), check_exact=True
+    )
+
+
+def test_read_maccor_txt_resume_changed():
+    content = _cycling_content(cycles=2)
+    checkpoint = {}
+    read_maccor_txt(content[: len(content) // 2], "S4000-UBHAM", checkpoint=checkpoint)
+
+    # the last line was incomplete, and an earlier line changed
+    assert checkpoint["offset"] < len(content) // 2
+    changed = content.replace(b"\n2\t0\t", b"\n2\t1\t", 1)
+    assert changed != content
+    resumed = {}
+    raw = read_maccor_txt(
+        changed, "S4000-UBHAM", resume=checkpoint, checkpoint=resumed
+    )
+
+    assert resumed["resumed_rows"] == 0
+    pd.testing.assert_frame_equal(raw, read_maccor_txt(changed, "S4000-UBHAM"))
+
+
+@pytest.mark.parametrize("fraction", [0.3, 0.9])
+def test_native_maccor_cell_resume(fraction):
+    content = _cycling_content(cycles=6)
+    appended = content.index(b"\n", int(len(content) * fraction)) + 1
+    checkpoint = {}
+    _native_maccor_cell(content[:appended], "S4000-UBHAM", checkpoint=checkpoint)
+
+    resumed = {}
+    c = _native_maccor_cell(
+        content, "S4000-UBHAM", resume=checkpoint, checkpoint=resumed
+    )
+    expected = _native_maccor_cell(content, "S4000-UBHAM")
+
+    assert resumed["resumed_rows"] > 0
+    for table in ["raw", "steps", "summary"]:
+        pd.testing.assert_frame_equal(
+            getattr(c.data, table), getattr(expected.data, table), check_exact=True
+        )
+    assert len(c.data.summary) == 6
+
+
+def test_transform_data_cellpy_append():
+    content = _cycling_content(cycles=3)
+    arguments = dict(
+        instrument="MACCOR-S4000-UBHAM",
+        test_type="CHARGE-DISCHARGE-GALVANOSTATIC CYCLING",
+        extension="TXT",
+    )
+    success, first = transform_data_cellpy(
+        content[: content.index(b"\n", len(content) // 2) + 1], append=True, **arguments
+    )
+    assert success and first["_checkpoint"]["steps"] is not None
+
+    success, data = transform_data_cellpy(
+        content, append=True, resume=first["_checkpoint"], **arguments
+    )
+    success, expected = transform_data_cellpy(content, **arguments)
+
+    assert data["_checkpoint"]["resumed_rows"] > 0
+    assert "_checkpoint" not in expected
+    for key in ["experiment_data", "experiment_summary"]:
+        pd.testing.assert_frame_equal(data[key], expected[key], check_exact=True)
@@ -0,0 +1,87 @@
+"""Tests for the metrics endpoint"""
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from leafspy import flask_server
+from leafspy.metrics import BYTES, ROWS, STAGE_SECONDS, Registry
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+LABELS = {
+    "instrument": "MACCOR-S4000-UBHAM",
+    "test_type": "CHARGE-DISCHARGE-GALVANOSTATIC CYCLING",
+}
+
+
+@pytest.fixture
+def app_config():
+    """Without conversion cache"""
+    return {"CACHE_ENABLED": False}
+
+
+def test_registry_exposition():
+    registry = Registry()
+    counter = registry.counter("uploads_total", "Uploads.", ["instrument"])
+    histogram = registry.histogram(
+        "stage_seconds", "Stages.", ["stage"], buckets=[0.1, 1]
+    )
+    counter.inc(instrument='a"b')
+    counter.inc(2, instrument='a"b')
+    histogram.observe(0.05, stage="convert")
+    histogram.observe(0.5, stage="convert")
+    with pytest.raises(ValueError):
+        counter.inc(-1, instrument="a")
+    with pytest.raises(ValueError):
+        counter.inc(unknown="a")
+
+    assert registry.expose().splitlines() == [
+        "# HELP uploads_total Uploads.",
+        "# TYPE uploads_total counter",
+        'uploads_total{instrument="a\\"b"} 3',
+        "# HELP stage_seconds Stages.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="convert",le="0.1"} 1',
+        'stage_seconds_bucket{stage="convert",le="1.0"} 2',
+        'stage_seconds_bucket{stage="convert",le="+Inf"} 2',
+        'stage_seconds_sum{stage="convert"} 0.55',
+        'stage_seconds_count{stage="convert"} 2',
+    ]
+    assert histogram.value(stage="convert") == (2, 0.55)
+
+
+def test_metrics_after_upload(client, upload):
+    content = (FIXTURE_DIR / "post-maccor-01.txt").read_bytes()
+    convert = {"stage": "convert", "converter": "cellpy", **LABELS}
+    converted_before = STAGE_SECONDS.value(**convert)[0]
+    rows_before = ROWS.value(converter="cellpy", **LABELS)
+    bytes_before = BYTES.value(direction="in_compressed", **LABELS)
+
+    response = upload(content)
+    payload = response.get_json()
+    response.close()
+    assert response.status_code == 200
+
+    assert STAGE_SECONDS.value(**convert)[0] == converted_before + 1
+    assert ROWS.value(converter="cellpy", **LABELS) == rows_before + len(
+        payload["experiment_data"]["data"]
+    )
+    assert BYTES.value(direction="in_compressed", **LABELS) == bytes_before + len(
+        gzip.compress(content)
+    )
+
+    metrics = client.get("/metrics")
+    assert metrics.mimetype == "text/plain"
+    text = metrics.get_data(as_text=True)
+    stages = ["sniff", "decompress", "spool_write", "convert", "serialize", "response"]
+    for stage in stages:
+        assert f'leafs_stage_seconds_count{{stage="{stage}",' in text
+    assert 'leafs_requests_total{endpoint="upload_file",status="200"}' in text
+    assert 'leafs_requests_in_flight{endpoint="metrics"} 1' in text
+
+
+def test_metrics_disabled(client, monkeypatch):
+    monkeypatch.setitem(flask_server.app.config, "METRICS_ENABLED", False)
+
+    assert client.get("/metrics").status_code == 404
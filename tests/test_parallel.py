@@ -0,0 +1,56 @@
+"""Tests for the parallel parsing of text files"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from leafspy import parallel
+from leafspy.maccor import read_maccor_txt
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_SIZE", 0)
+
+
+def test_line_ranges(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"header\n" + b"".join(b"%d\t%d\n" % (i, i * i) for i in range(1000)))
+    start = parallel.data_offset(path, 1)
+
+    ranges = parallel.line_ranges(path, start, 4)
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == start == len(b"header\n")
+    assert ranges[-1][1] == path.stat().st_size
+    content = path.read_bytes()
+    for (_, end), (next_start, _) in zip(ranges[:-1], ranges[1:]):
+        assert end == next_start
+        assert content[end - 1 : end] == b"\n"
+
+
+def test_read_csv_parallel(tmp_path, always_parallel):
+    path = tmp_path / "data.txt"
+    df = pd.DataFrame({"x": np.arange(5000), "y": np.linspace(0, 1, 5000)})
+    with open(path, "w") as f:
+        f.write("some header line\n")
+        df.to_csv(f, sep="\t", index=False)
+
+    result = parallel.read_csv(path, workers=3, skiprows=1, sep="\t")
+
+    pd.testing.assert_frame_equal(result, df)
+
+
+@pytest.mark.parametrize(
+    "file_name, model",
+    [("post-maccor-01.txt", "S4000-UBHAM"), ("post-maccor-03.txt", "S4000-KIT")],
+)
+def test_read_maccor_txt_parallel(always_parallel, file_name, model):
+    serial = read_maccor_txt(FIXTURE_DIR / file_name, model)
+    parallel_parts = read_maccor_txt(FIXTURE_DIR / file_name, model, workers=3)
+
+    pd.testing.assert_frame_equal(parallel_parts, serial)
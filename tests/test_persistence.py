@@ -0,0 +1,220 @@
+"""Tests for storing conversion results"""
+
+import gzip
+import io
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from leafspy import flask_server, persistence
+from leafspy.data_handler import _compact_result, insert_value
+from leafspy.persistence import _CsvStream, create_store, get_store
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = create_store(f"sqlite:///{tmp_path / 'leafs.db'}", max_connections=2)
+    store.create_tables()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def data():
+    n = 1000
+    raw = pd.DataFrame(
+        {
+            "data_point": np.arange(1, n + 1),
+            "test_time": np.linspace(0, 3600, n),
+            "date_time": pd.date_range("2021-01-01", periods=n, freq="s"),
+            "cycle_index": np.repeat([1, 2], n // 2),
+            "voltage": np.linspace(3.0, 4.2, n),
+            "current": np.full(n, 0.001),
+        }
+    )
+    summary = pd.DataFrame(
+        {"cycle_index": [1, 2], "discharge_capacity": [1.5, np.nan]}, index=[1, 2]
+    )
+    summary.index.name = "cycle_index"
+    return {
+        "experiment_info": {"channel_number": 1},
+        "experiment_summary": summary,
+        "experiment_data": raw,
+    }
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'leafs.db'}"
+    monkeypatch.setitem(flask_server.app.config, "DATABASE_URL", url)
+    yield url
+    get_store(url).close()
+
+
+def _files(*names):
+    content = gzip.compress((FIXTURE_DIR / "post-maccor-01.txt").read_bytes())
+    return [
+        FileStorage(stream=io.BytesIO(content), filename=f"{name}.txt.gz")
+        for name in names
+    ]
+
+
+def _stored(url, experiment_id):
+    return get_store(url).load_table("raw_data", experiment_id)
+
+
+def test_save_experiment(store, data):
+    first = store.save_experiment("cell_1", data)
+    second = store.save_experiment("cell_2", data)
+
+    raw = store.load_table("raw_data", second)
+    summary = store.load_table("summary_data", second)
+
+    assert second == first + 1
+    assert len(raw) == 1000
+    np.testing.assert_allclose(raw["voltage"], data["experiment_data"]["voltage"])
+    assert raw["date_time"].iloc[0] == pd.Timestamp("2021-01-01", tz="UTC").timestamp()
+    assert raw["charge_capacity"].isna().all()
+    assert summary["discharge_capacity"].iloc[0] == 1.5
+    assert np.isnan(summary["discharge_capacity"].iloc[1])
+
+
+def test_save_experiment_compact(store, data):
+    expected = store.load_table("raw_data", store.save_experiment("cell_1", data))
+    _compact_result(data)
+    assert data["experiment_data"]["date_time"].dtype == np.int64
+
+    raw = store.load_table("raw_data", store.save_experiment("cell_2", data))
+
+    pd.testing.assert_series_equal(raw["date_time"], expected["date_time"])
+    assert raw["date_time"].iloc[0] == pd.Timestamp("2021-01-01", tz="UTC").timestamp()
+
+
+def test_save_experiment_extra_columns(store, data):
+    data["experiment_data"]["temperature"] = 25.0
+    data["experiment_data"].loc[0, "temperature"] = np.nan
+
+    raw = store.load_table("raw_data", store.save_experiment("cell_1", data))
+    summary = store.load_table("summary_data", store.save_experiment("cell_1", data))
+
+    assert json.loads(raw["extra"].iloc[0]) == {"temperature": None}
+    assert json.loads(raw["extra"].iloc[1]) == {"temperature": 25.0}
+    assert summary["extra"].isna().all()
+
+
+def test_create_tables_adds_extra_column(tmp_path):
+    store = create_store(f"sqlite:///{tmp_path / 'leafs.db'}")
+    with store.connection() as connection:
+        connection.execute("CREATE TABLE raw_data (experiment_id INTEGER, voltage REAL)")
+    store.create_tables()
+    store.create_tables()
+
+    with store.connection() as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(raw_data)")]
+    store.close()
+    assert columns == ["experiment_id", "voltage", "extra"]
+
+
+def test_save_experiment_rollback(store, data):
+    data["experiment_info"] = {"not json serializable": object()}
+    data["experiment_data"] = "not a frame"
+    store.save_experiment("cell_1", data)
+
+    with pytest.raises(Exception):
+        with store.connection() as connection:
+            connection.execute("INSERT INTO experiments(name) VALUES('cell_2')")
+            raise RuntimeError("something went wrong")
+
+    with store.connection() as connection:
+        names = connection.execute("SELECT name FROM experiments").fetchall()
+    assert names == [("cell_1",)]
+
+
+def test_insert_value_is_parameterized(store):
+    value = {"text": "it's ') ; DROP TABLE test; --"}
+
+    assert insert_value(value, store=store)
+
+    with store.connection() as connection:
+        rows = connection.execute("SELECT name, value FROM test").fetchall()
+    assert rows == [("test_1", '{"text": "it\'s \') ; DROP TABLE test; --"}')]
+
+
+def test_csv_stream():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [0.5, None, 1.5]})
+    stream = _CsvStream(df, experiment_id=7, chunk_rows=2)
+
+    assert stream.readline() == "1,0.5,7\n"
+    assert stream.read() == "2,,7\n3,1.5,7\n"
+    assert stream.read() == ""
+
+
+def test_create_store_unsupported():
+    with pytest.raises(ValueError):
+        create_store("mysql://localhost/db")
+    with pytest.raises(ValueError):
+        create_store("sqlite://")
+
+
+def test_upload_file_persist(upload, database_url):
+    payload = upload(files=_files("channel_1"), persist="1").get_json()
+
+    assert "experiment_data" in payload
+    assert len(_stored(database_url, payload["experiment_id"])) > 0
+
+
+def test_upload_file_persist_async(client, upload, database_url):
+    response = upload(files=_files("channel_1"), persist="1", **{"async": "1"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    end = time.time() + 120
+    while client.get(f"/jobs/{job_id}").get_json()["status"] in ["queued", "running"]:
+        assert time.time() < end
+        time.sleep(0.05)
+    payload = client.get(f"/jobs/{job_id}/result").get_json()
+
+    assert len(_stored(database_url, payload["experiment_id"])) > 0
+
+
+def test_upload_file_persist_multiple_files(upload, database_url):
+    payload = upload(files=_files("channel_1", "channel_2"), persist="1").get_json()
+
+    assert [f["Code"] for f in payload["files"]] == [0, 0]
+    first, second = [f["experiment_id"] for f in payload["files"]]
+    assert second != first
+    assert len(_stored(database_url, second)) == len(_stored(database_url, first))
+
+
+def test_upload_file_persist_database_error(upload, database_url, monkeypatch):
+    def exhausted(url):
+        raise RuntimeError("connection pool exhausted")
+
+    monkeypatch.setattr(persistence, "get_store", exhausted)
+
+    payload = upload(files=_files("channel_1"), persist="1").get_json()
+    assert payload == {
+        "Code": 1,
+        "Message": "Could not store the result in the database",
+    }
+
+    payload = upload(files=_files("channel_1", "channel_2"), persist="1").get_json()
+    assert [f["Code"] for f in payload["files"]] == [1, 1]
+
+
+@pytest.mark.parametrize("app_config", [{"DATABASE_URL": None}], indirect=True)
+def test_upload_file_persist_no_database(upload):
+
+    for names in [["channel_1"], ["channel_1", "channel_2"]]:
+        payload = upload(files=_files(*names), persist="1", **{"async": "1"}).get_json()
+        assert payload == {
+            "Code": 1,
+            "Message": "No database configured for storing results",
+        }
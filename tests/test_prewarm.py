@@ -0,0 +1,93 @@
+"""Tests for the lazy loading and prewarming of the converter backends"""
+
+import multiprocessing
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from leafspy import flask_server
+
+BACKENDS = ["cellpy", "galvani", "pandas", "psycopg2"]
+
+
+@pytest.fixture
+def prewarm_config(monkeypatch):
+    monkeypatch.setitem(flask_server.app.config, "PREWARM", True)
+    monkeypatch.setitem(flask_server.app.config, "JOB_WORKERS", 1)
+    monkeypatch.setattr(flask_server, "_job_manager", None)
+    monkeypatch.setattr(flask_server, "_prewarmed", False)
+    yield
+    if flask_server._job_manager is not None:
+        flask_server._job_manager.shutdown()
+    flask_server._ready.set()
+
+
+def _imported_modules(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return set(output.split())
+
+
+def test_server_import_is_lazy():
+    modules = _imported_modules("import leafspy.flask_server")
+
+    assert not modules & set(BACKENDS)
+
+
+def test_prewarm_imports_backends():
+    modules = _imported_modules("from leafspy.data_handler import prewarm; prewarm()")
+
+    assert set(BACKENDS) <= modules
+
+
+def test_ready_without_prewarm(client):
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"Code": 0, "Message": "Ready", "prewarmed": False}
+
+
+def test_ready_after_prewarm(client, prewarm_config):
+    flask_server.start_prewarm()
+    end = time.time() + 120
+    while (response := client.get("/ready")).status_code == 503:
+        assert response.get_json()["Message"] == "Warming up"
+        assert time.time() < end
+        time.sleep(0.05)
+
+    assert response.status_code == 200
+    assert response.get_json()["prewarmed"] is True
+    assert flask_server._job_manager.initializer is not None
+
+
+def test_ready_after_failed_prewarm(client, prewarm_config, monkeypatch):
+    def broken():
+        raise ImportError("no backend")
+
+    monkeypatch.setattr(flask_server, "prewarm", broken)
+    flask_server.start_prewarm()
+    assert flask_server._ready.wait(120)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.get_json()["prewarmed"] is False
+
+
+def _prewarm_threads():
+    import leafspy.flask_server  # noqa: F401
+
+    return [t.name for t in threading.enumerate() if t.name == "prewarm"]
+
+
+def test_no_prewarm_in_workers(monkeypatch):
+    # a spawned worker imports the server module again (with the same settings)
+    monkeypatch.setenv("LEAFSPY_PREWARM", "true")
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        assert executor.submit(_prewarm_threads).result() == []
@@ -0,0 +1,54 @@
+"""Tests for the profiling of requests"""
+
+
+import pytest
+
+from leafspy import flask_server
+from leafspy.profiling import RequestProfile, trace_memory
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """With profiling (without conversion cache)"""
+    return {"CACHE_ENABLED": False, "PROFILING": True, "PROFILE_FOLDER": str(tmp_path)}
+
+
+def test_request_profile():
+    profile = RequestProfile()
+    profile.record("convert", 0.25)
+    profile.record("convert", 0.5)
+
+    timing = profile.server_timing().split(", ")
+    assert timing[0] == "convert;dur=750.000"
+    assert timing[1].startswith("total;dur=")
+    assert profile.stop() is None
+
+
+def test_trace_memory():
+    with trace_memory({}) as memory:
+        data = bytearray(10_000_000)
+    assert memory["peak"] >= len(data)
+
+
+def test_upload_profiled(upload, tmp_path):
+    response = upload(headers={"X-Leafs-Profile": "1"})
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"].split(", ")
+    assert [entry.split(";")[0] for entry in timing] == [
+        "sniff",
+        "decompress",
+        "spool_write",
+        "convert",
+        "serialize",
+        "total",
+    ]
+    assert int(response.headers["X-Leafs-Memory-Peak"]) > 0
+    assert (tmp_path / response.headers["X-Leafs-Profile-File"]).is_file()
+
+
+def test_upload_not_profiled(upload, monkeypatch):
+    assert "Server-Timing" not in upload().headers
+
+    monkeypatch.setitem(flask_server.app.config, "PROFILING", False)
+    assert "Server-Timing" not in upload(headers={"X-Leafs-Profile": "1"}).headers
@@ -0,0 +1,117 @@
+"""Tests for the response serialization"""
+
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+from leafspy.responses import iter_json, negotiate_format, write_bundle, write_npz
+
+
+@pytest.fixture
+def frame():
+    n = 1234
+    return pd.DataFrame(
+        {
+            "data_point": np.arange(n),
+            "voltage": np.linspace(2.5, 4.2, n),
+            "current": np.where(np.arange(n) % 7 == 0, np.nan, 0.001),
+            "date_time": pd.date_range("2021-01-01", periods=n, freq="s"),
+        },
+        index=np.arange(10, 10 + n),
+    )
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 100, 1234, 10_000])
+def test_iter_json_frame_matches_split_orient(frame, chunk_rows):
+    expected = json.loads(frame.to_json(orient="split"))
+    streamed = json.loads("".join(iter_json(frame, chunk_rows=chunk_rows)))
+    assert streamed == expected
+
+
+def test_iter_json_nested(frame):
+    data = {
+        "experiment_info": {"channel_number": 1, "schedule_file_name": "unknown"},
+        "experiment_data": frame,
+        "empty": frame.iloc[0:0],
+    }
+    streamed = json.loads("".join(iter_json(data, chunk_rows=50)))
+    assert streamed["experiment_info"] == data["experiment_info"]
+    assert streamed["experiment_data"] == json.loads(frame.to_json(orient="split"))
+    assert streamed["empty"]["data"] == []
+
+
+@pytest.mark.parametrize(
+    "requested, accept, expected",
+    [
+        (None, None, "json"),
+        (None, [("*/*", 1)], "json"),
+        (None, [("application/vnd.apache.arrow.file", 1)], "arrow"),
+        ("Parquet", [("application/vnd.apache.arrow.file", 1)], "parquet"),
+        ("xlsx", None, None),
+    ],
+)
+def test_negotiate_format(requested, accept, expected):
+    accept = MIMEAccept(accept) if accept else None
+    assert negotiate_format(requested, accept) == expected
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_write_bundle(frame, fmt):
+    pa = pytest.importorskip("pyarrow")
+    summary = frame.iloc[::100].copy()
+    summary.index.name = "data_point"
+    data = {
+        "experiment_info": {"channel_number": 1},
+        "experiment_summary": summary,
+        "experiment_data": frame,
+    }
+
+    buffer = io.BytesIO()
+    write_bundle(data, fmt, buffer)
+
+    with zipfile.ZipFile(buffer) as bundle:
+        assert json.loads(bundle.read("metadata.json")) == {
+            "experiment_info": {"channel_number": 1}
+        }
+        member = bundle.read(f"experiment_data.{fmt}")
+        if fmt == "arrow":
+            table = pa.ipc.open_file(pa.py_buffer(member)).read_all()
+        else:
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(io.BytesIO(member))
+        assert bundle.getinfo(f"experiment_data.{fmt}").compress_type == zipfile.ZIP_STORED
+
+    assert json.loads(table.schema.metadata[b"leafs"]) == {
+        "experiment_info": {"channel_number": 1}
+    }
+    pd.testing.assert_frame_equal(table.to_pandas(), frame, check_freq=False)
+
+
+def test_write_npz(frame):
+    buffer = io.BytesIO()
+    write_npz({"experiment_info": {"channel_number": 1}, "experiment_data": frame}, buffer)
+    buffer.seek(0)
+
+    with np.load(buffer) as npz:
+        assert json.loads(npz["metadata"].item()) == {
+            "experiment_info": {"channel_number": 1}
+        }
+        np.testing.assert_array_equal(npz["experiment_data/voltage"], frame["voltage"])
+        np.testing.assert_array_equal(npz["experiment_data/__index__"], frame.index)
+
+
+def test_upload_file_post_maccor_npz(upload):
+    response = upload(response_format="npz")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-npz"
+    with np.load(io.BytesIO(response.get_data())) as npz:
+        assert "experiment_info" in json.loads(npz["metadata"].item())
+        assert len(npz["experiment_data/voltage"]) > 0
+        assert len(npz["experiment_summary/cycle_index"]) > 0
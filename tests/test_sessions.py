@@ -0,0 +1,181 @@
+"""Tests for the resumable (chunked) uploads"""
+
+import base64
+import gzip
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from leafspy import flask_server
+from leafspy.sessions import UploadSessions, parse_digest
+from leafspy.staging import STAGED_PREFIX, Staging
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+FORM = {
+    "test_type": "CHARGE-DISCHARGE",
+    "test_type_subcategory": "GALVANOSTATIC CYCLING",
+    "instrument": "S4000-UBHAM",
+    "instrument_brand": "MACCOR",
+}
+
+
+@pytest.fixture
+def staging(tmp_path, monkeypatch):
+    """The staging area and the upload sessions of the app (without conversion cache)"""
+    area = Staging(tmp_path / "staging", max_memory=1024)
+    monkeypatch.setattr(flask_server, "_staging", area)
+    monkeypatch.setattr(flask_server, "_upload_sessions", None)
+    return area
+
+
+@pytest.fixture
+def app_config(staging):
+    """With the staging area (without conversion cache)"""
+    return {"CACHE_ENABLED": False}
+
+
+@pytest.fixture
+def compressed():
+    return gzip.compress((FIXTURE_DIR / "post-maccor-01.txt").read_bytes())
+
+
+def _digest(data):
+    return f"sha-256=:{base64.b64encode(hashlib.sha256(data).digest()).decode()}:"
+
+
+def _put(client, session_id, data, start, size="*", digest=None):
+    return client.put(
+        f"/upload_sessions/{session_id}",
+        data=data,
+        headers={
+            "Content-Range": f"bytes {start}-{start + len(data) - 1}/{size}",
+            "Content-Digest": digest or _digest(data),
+        },
+    )
+
+
+def _create(client, filename="session.txt.gz", **fields):
+    response = client.post("/upload_sessions", data={**FORM, "filename": filename, **fields})
+    return response, response.get_json()
+
+
+def test_parse_digest():
+    digest = hashlib.sha256(b"abc").digest()
+    encoded = base64.b64encode(digest).decode()
+
+    assert parse_digest(f"sha-256=:{encoded}:") == ("sha-256", digest)
+    assert parse_digest(f"md5=:AAAA:, SHA-256=:{encoded}:") == ("sha-256", digest)
+    for header in [None, "md5=:AAAA:", "sha-256=abc", "sha-256=:not base64:"]:
+        with pytest.raises(ValueError):
+            parse_digest(header)
+
+
+def test_upload_session(client, staging, compressed):
+    response, created = _create(client, size=str(len(compressed)))
+    assert response.status_code == 201
+    assert response.headers["Location"] == f"/upload_sessions/{created['session_id']}"
+    assert created["offset"] == 0
+    session_id = created["session_id"]
+
+    chunk = len(compressed) // 3 + 1
+    for start in range(0, len(compressed), chunk):
+        response = _put(client, session_id, compressed[start : start + chunk], start)
+        assert response.status_code == 200
+        assert response.get_json()["offset"] == min(start + chunk, len(compressed))
+
+    status = client.get(f"/upload_sessions/{session_id}").get_json()
+    assert status["offset"] == status["size"] == len(compressed)
+
+    response = client.post(f"/upload_sessions/{session_id}/finalize")
+    payload = response.get_json()
+    response.close()
+    assert response.status_code == 200
+    assert len(payload["experiment_data"]["data"]) > 0
+    assert client.get(f"/upload_sessions/{session_id}").status_code == 404
+    assert list(staging.folder.glob(f"{STAGED_PREFIX}*")) == []
+    assert staging.disk_usage == 0
+
+
+def test_upload_session_rejected_chunks(client, compressed):
+    session_id = _create(client)[1]["session_id"]
+    first, rest = compressed[:1000], compressed[1000:]
+
+    response = _put(client, session_id, first, 0, digest=_digest(b"other"))
+    assert response.status_code == 400
+    assert response.get_json()["offset"] == 0
+
+    response = client.put(
+        f"/upload_sessions/{session_id}",
+        data=first[:500],
+        headers={"Content-Range": "bytes 0-999/*", "Content-Digest": _digest(first)},
+    )
+    assert response.status_code == 400
+    assert response.get_json()["offset"] == 0
+
+    response = _put(client, session_id, first, 0)
+    assert response.get_json()["offset"] == 1000
+
+    # a chunk that was already received, or one that skips data
+    assert _put(client, session_id, first, 0).status_code == 409
+    response = _put(client, session_id, rest, 2000)
+    assert response.status_code == 409
+    assert response.get_json()["offset"] == 1000
+
+    response = client.put(f"/upload_sessions/{session_id}", data=rest)
+    assert response.status_code == 400
+
+    response = _put(client, session_id, rest, 1000, size=len(compressed))
+    assert response.get_json()["offset"] == len(compressed)
+    response = client.post(f"/upload_sessions/{session_id}/finalize")
+    response.close()
+    assert response.status_code == 200
+
+
+def test_upload_session_incomplete(client, compressed):
+    session_id = _create(client, size=str(len(compressed)))[1]["session_id"]
+    _put(client, session_id, compressed[:1000], 0)
+
+    response = client.post(f"/upload_sessions/{session_id}/finalize")
+
+    assert response.status_code == 409
+    assert response.get_json()["offset"] == 1000
+    assert _put(client, session_id, compressed[1000:] + b"x", 1000).status_code == 400
+
+
+@pytest.mark.parametrize(
+    "fields, message",
+    [
+        ({"filename": "session.txt"}, "Only compressed files allowed"),
+        ({"filename": "session.res.gz"}, "not supported in RES files"),
+        ({"size": "-1"}, "positive number of bytes"),
+        ({"instrument_brand": ""}, "Please provide an instrument brand"),
+    ],
+)
+def test_upload_session_rejected(client, fields, message):
+    response, payload = _create(client, **fields)
+
+    assert payload["Code"] == 1
+    assert message in payload["Message"]
+
+
+def test_upload_session_abort(client, staging, compressed):
+    session_id = _create(client)[1]["session_id"]
+    _put(client, session_id, compressed[:2000], 0)
+
+    assert client.delete(f"/upload_sessions/{session_id}").get_json()["Code"] == 0
+
+    assert client.get(f"/upload_sessions/{session_id}").status_code == 404
+    assert client.delete(f"/upload_sessions/{session_id}").status_code == 404
+    assert list(staging.folder.glob(f"{STAGED_PREFIX}*")) == []
+    assert staging.disk_usage == 0
+
+
+def test_upload_sessions_expire(tmp_path):
+    staging = Staging(tmp_path)
+    sessions = UploadSessions(staging, ttl=60)
+    session = sessions.create("session.txt.gz")
+    session.updated -= 61
+
+    assert sessions.get(session.session_id) is None
+    assert not session.staged.path.exists()
@@ -0,0 +1,89 @@
+"""Tests for the content sniffer"""
+
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+
+from leafspy.ingest import peek_compressed
+from leafspy.sniffer import HDF5_MAGIC, MPR_MAGIC, SNIFF_SIZE, sniff
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+XRD_TEXT = b"2Theta  Intensity\n" + b"".join(
+    b"  %.2f   %d\n" % (10 + i * 0.02, i % 50) for i in range(500)
+)
+
+
+@pytest.mark.parametrize(
+    "file_name, file_type, instrument",
+    [
+        ("post-arbin-cellpy.res", "RES", "ARBIN-BT-2000"),
+        ("post-maccor-01.txt", "TXT", "MACCOR-S4000-UBHAM"),
+        ("post-maccor-03.txt", "TXT", "MACCOR-S4000-KIT"),
+    ],
+)
+def test_sniff_fixtures(file_name, file_type, instrument):
+    sniffed = sniff((FIXTURE_DIR / file_name).read_bytes()[:SNIFF_SIZE])
+
+    assert sniffed.file_type == file_type
+    assert [s["instrument"] for s in sniffed.suggestions()] == [instrument]
+
+
+def test_sniff_binary_formats():
+    mpr = sniff(MPR_MAGIC.ljust(48) + bytes(100))
+    assert mpr.file_type == "MPR"
+    assert {s["instrument"] for s in mpr.suggestions()} == {
+        "BIOLOGIC-VMP3",
+        "BIOLOGIC-MPG2",
+    }
+    assert sniff(HDF5_MAGIC + bytes(100)).file_type == "H5"
+    assert sniff(bytes(512) + HDF5_MAGIC + bytes(100)).file_type == "H5"
+
+
+def test_sniff_text():
+    xrd = sniff(XRD_TEXT[:SNIFF_SIZE])
+    assert xrd.test_types == ["XRD"]
+    assert all(s["test_type"] == "XRD" for s in xrd.suggestions())
+
+    assert sniff(b"1\t0.1\t3.9\n" * 100) is None
+    assert sniff(b"some text\n") is None
+
+
+def test_peek_compressed_gzip():
+    content = XRD_TEXT * 20
+    _, head, stream = peek_compressed(
+        io.BytesIO(gzip.compress(content)), 1000, "gzip", chunk_size=100
+    )
+
+    assert head == content[:1000]
+    assert gzip.decompress(stream.read()) == content
+
+
+def test_peek_compressed_gzip_invalid():
+    with pytest.raises(gzip.BadGzipFile):
+        peek_compressed(io.BytesIO(b"not gzip data" * 10), 100, "gzip")
+
+
+def test_upload_file_post_sniffed_mismatch(upload):
+    response = upload((FIXTURE_DIR / "post-maccor-03.txt").read_bytes())
+    payload = response.get_json()
+
+    assert payload["Code"] == 1
+    assert "MACCOR-S4000-KIT" in payload["Message"]
+    assert payload["suggestions"] == [
+        {
+            "extension": "TXT",
+            "test_type": "CHARGE-DISCHARGE-GALVANOSTATIC CYCLING",
+            "instrument": "MACCOR-S4000-KIT",
+        }
+    ]
+
+
+def test_upload_file_post_sniffed_xrd(upload):
+    response = upload(XRD_TEXT)
+    payload = response.get_json()
+
+    assert payload["Code"] == 1
+    assert {s["test_type"] for s in payload["suggestions"]} == {"XRD"}
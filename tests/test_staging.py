@@ -0,0 +1,183 @@
+"""Tests for the staging area of the uploads"""
+
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from leafspy import data_handler, flask_server
+from leafspy.maccor import read_maccor_txt
+from leafspy.staging import STAGED_PREFIX, Staging, StagingQuotaExceeded
+
+FIXTURE_DIR = Path(__file__).parents[1].resolve() / "test_data"
+
+
+@pytest.fixture
+def staging(tmp_path, monkeypatch):
+    """A small staging area used by the app (without conversion cache)"""
+    area = Staging(tmp_path / "staging", max_memory=1024, disk_quota=None)
+    monkeypatch.setattr(flask_server, "_staging", area)
+    return area
+
+
+@pytest.fixture
+def app_config(staging):
+    """With the staging area (without conversion cache)"""
+    return {"CACHE_ENABLED": False}
+
+
+def _staged_files(staging):
+    return list(staging.folder.glob(f"{STAGED_PREFIX}*"))
+
+
+def test_staged_upload_in_memory(staging):
+    with staging.stage(".txt") as staged:
+        staged.write(b"x" * 1000)
+        staged.close()
+
+        assert staged.in_memory
+        assert staged.source() == b"x" * 1000
+    assert _staged_files(staging) == []
+
+
+def test_staged_upload_rolled_over(staging):
+    staged = staging.stage(".txt")
+    staged.write(b"x" * 1000)
+    staged.write(b"y" * 1000)
+    staged.close()
+
+    assert not staged.in_memory
+    assert Path(staged.source()).read_bytes() == b"x" * 1000 + b"y" * 1000
+    assert Path(staged.source()).suffix == ".txt"
+    assert staging.disk_usage == 2000
+
+    # e.g. a job that is still running
+    staged.acquire()
+    staged.release()
+    assert Path(staged.source()).exists()
+    staged.release()
+    assert _staged_files(staging) == []
+    assert staging.disk_usage == 0
+
+
+def test_staging_disk_quota(staging):
+    staging.disk_quota = 3000
+    first = staging.stage()
+    first.write(b"x" * 2000)
+
+    second = staging.stage()
+    with pytest.raises(StagingQuotaExceeded):
+        second.write(b"x" * 2000)
+    second.release()
+    assert staging.disk_usage == 2000
+
+    first.release()
+    assert staging.disk_usage == 0
+    assert _staged_files(staging) == []
+
+
+def test_staging_sweep(staging):
+    staging.folder.mkdir()
+    abandoned = staging.folder / f"{STAGED_PREFIX}abandoned.txt"
+    abandoned.write_bytes(b"x")
+    other = staging.folder / "other.txt"
+    other.write_bytes(b"x")
+    staged = staging.stage()
+    staged.write(b"x" * 2000)
+    old = time.time() - staging.max_age - 1
+    for path in [abandoned, other, staged.path]:
+        os.utime(path, (old, old))
+
+    assert staging.sweep() == 1
+
+    assert not abandoned.exists()
+    assert other.exists()
+    assert staged.path.exists()
+    staged.release()
+
+
+def test_staging_janitor(staging):
+    staging.folder.mkdir()
+    abandoned = staging.folder / f"{STAGED_PREFIX}abandoned.txt"
+    abandoned.write_bytes(b"x")
+    staging.max_age = 0
+
+    staging.start_janitor(interval=0.01)
+    try:
+        for _ in range(100):
+            if not abandoned.exists():
+                break
+            time.sleep(0.01)
+    finally:
+        staging.stop_janitor()
+    assert not abandoned.exists()
+
+
+@pytest.mark.parametrize("max_memory", [1024, 64 * 1024**2])
+def test_upload_staged(staging, upload, max_memory):
+    staging.max_memory = max_memory
+
+    response = upload()
+
+    assert response.status_code == 200
+    assert len(response.get_json()["experiment_data"]["data"]) > 0
+    assert _staged_files(staging) == []
+    assert staging.disk_usage == 0
+
+
+def test_upload_staging_quota(staging, upload):
+    staging.disk_quota = 2048
+
+    response = upload(b"1\t0.1\t3.9\n" * 1000)
+
+    assert response.status_code == 507
+    assert response.get_json()["Code"] == 2
+    assert _staged_files(staging) == []
+    assert staging.disk_usage == 0
+
+
+def test_upload_staged_for_cellpy(staging, upload, monkeypatch):
+    # cellpy only reads files
+    monkeypatch.setattr(data_handler, "NATIVE_MACCOR_READER", False)
+    staging.max_memory = 64 * 1024**2
+    convert_file = flask_server.convert_file
+    sources = []
+
+    def recording_convert_file(data_converter, source, **kwargs):
+        sources.append(source)
+        return convert_file(data_converter, source, **kwargs)
+
+    monkeypatch.setattr(flask_server, "convert_file", recording_convert_file)
+
+    response = upload()
+
+    assert response.status_code == 200
+    assert Path(sources[0]).parent == staging.folder
+    assert Path(sources[0]).name.startswith(STAGED_PREFIX)
+    assert _staged_files(staging) == []
+    assert staging.disk_usage == 0
+
+    staging.disk_quota = 2048
+    response = upload(b"1\t0.1\t3.9\n" * 1000)
+    assert response.status_code == 507
+    assert staging.disk_usage == 0
+
+
+def test_upload_failed_released(staging, upload):
+    # the conversion fails (with an exception)
+    response = upload(b"no data\n" * 1000)
+
+    assert response.status_code == 500
+    assert _staged_files(staging) == []
+    assert staging.disk_usage == 0
+
+
+def test_read_maccor_txt_from_memory():
+    path = FIXTURE_DIR / "post-maccor-01.txt"
+
+    pd.testing.assert_frame_equal(
+        read_maccor_txt(path.read_bytes(), "S4000-UBHAM"),
+        read_maccor_txt(path, "S4000-UBHAM"),
+    )
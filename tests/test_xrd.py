@@ -0,0 +1,114 @@
+"""Tests for the vectorized XRD reader"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from leafspy import parallel
+from leafspy.data_handler import transform_data_xrd
+from leafspy.xrd import read_xrd
+
+
+def _write_scans(path, scans, points=500, header="STOE scan {scan}: 2Theta  Intensity"):
+    rng = np.random.default_rng(0)
+    expected = []
+    with open(path, "w") as f:
+        for scan in range(scans):
+            two_theta = np.round(np.linspace(10, 80, points), 4)
+            intensity = np.round(rng.uniform(10, 1000 * (scan + 1), points), 1)
+            f.write(header.format(scan=scan) + "\n")
+            for x, y in zip(two_theta, intensity):
+                f.write(f"  {x:.4f}   {y:.1f}\n")
+            f.write("\n")
+            expected.append(
+                pd.DataFrame(
+                    {
+                        "2theta": two_theta,
+                        "intensity": intensity / intensity.max(),
+                        "scan": scan,
+                    }
+                )
+            )
+    return pd.concat(expected, ignore_index=True)
+
+
+def test_read_xrd_single_scan(tmp_path):
+    path = tmp_path / "xrd.txt"
+    expected = _write_scans(path, 1, header="2Theta  Intensity")
+
+    df = read_xrd(path)
+
+    # the same as the python engine parser did
+    old = pd.read_csv(path, sep=r"\s+", engine="python", header=0, index_col=False)
+    old.columns = ["2theta", "intensity"]
+    old["intensity"] = old["intensity"] / max(old["intensity"])
+    pd.testing.assert_frame_equal(df, old)
+    pd.testing.assert_frame_equal(df, expected.drop(columns="scan"))
+
+
+def test_read_xrd_scans(tmp_path):
+    path = tmp_path / "xrd.txt"
+    expected = _write_scans(path, 4)
+
+    df = read_xrd(path)
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert (df.groupby("scan")["intensity"].max() == 1.0).all()
+
+
+def test_read_xrd_without_header(tmp_path):
+    path = tmp_path / "xrd.txt"
+    path.write_text("10.0 5\n\n10.5 20\r\n11.0 10\n")
+
+    df = read_xrd(path)
+
+    assert df["2theta"].tolist() == [10.0, 10.5, 11.0]
+    assert df["intensity"].tolist() == [0.25, 1.0, 0.5]
+
+
+def test_read_xrd_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_SIZE", 0)
+    path = tmp_path / "xrd.txt"
+    expected = _write_scans(path, 5, points=301)
+
+    df = read_xrd(path, workers=3)
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize("blank_line", [False, True])
+def test_read_xrd_parallel_range_after_header(tmp_path, monkeypatch, blank_line):
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_SIZE", 0)
+    path = tmp_path / "xrd.txt"
+    expected = _write_scans(path, 3, points=301)
+    content = path.read_bytes()
+    # a range that starts right after the header of the second scan (or the blank line
+    # before it)
+    header = content.index(b"STOE scan 1")
+    boundary = header if blank_line else content.index(b"\n", header) + 1
+    ranges = [(0, boundary), (boundary, len(content))]
+    monkeypatch.setattr(parallel, "line_ranges", lambda *args: ranges)
+
+    df = read_xrd(path, workers=2)
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_transform_data_xrd(tmp_path):
+    path = tmp_path / "xrd.txt"
+    _write_scans(path, 2)
+
+    success, data = transform_data_xrd(path, projection=None)
+
+    assert success
+    assert data["experiment_info"]["scans"] == 2
+    assert len(data["experiment_data"]) == 1000
+    # the file is removed by the staging area, not by the converter
+    assert path.exists()
+
+    success, from_memory = transform_data_xrd(path.read_bytes(), projection=None)
+
+    assert success
+    pd.testing.assert_frame_equal(
+        from_memory["experiment_data"], data["experiment_data"]
+    )